@@ -0,0 +1,106 @@
+import time
+from datetime import datetime
+from functools import wraps, partial
+from hashlib import sha1
+from typing import Callable, Type, Dict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Model
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.status import HTTP_200_OK
+
+CACHE_HEADER = 'X-Cache'
+
+
+def get_version_key(model: Type[Model]) -> str:
+    return f'cache_version:{model._meta.label_lower}'
+
+
+def get_model_versions(*models: Type[Model]) -> Dict[str, int]:
+    keys = [get_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # a lost counter must not restart from a value older entries were cached under
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key, time.time_ns())
+    return versions
+
+
+def bump_model_version(model: Type[Model]) -> None:
+    key = get_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def invalidate_model_cache(model: Type[Model]) -> None:
+    bump_model_version(model)
+    # bump again once the transaction is visible, so nothing read in between stays cached
+    transaction.on_commit(partial(bump_model_version, model))
+
+
+def get_request_fingerprint(request: Request) -> str:
+    query = '&'.join(f'{key}={",".join(sorted(values))}' for key, values in sorted(request.query_params.lists()))
+    return sha1(f'{request.scheme}://{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+
+
+def get_response_cache_key(request: Request, *models: Type[Model]) -> str:
+    versions = get_model_versions(*models)
+    return f'response:{":".join(str(versions[key]) for key in sorted(versions))}:{get_request_fingerprint(request)}'
+
+
+def get_object_updated(request: Request, model: Type[Model], pk: str) -> datetime | None:
+    if not hasattr(request, '_object_updated'):
+        try:
+            request._object_updated = model.objects.filter(pk=pk).values_list('updated', flat=True).first()
+        except (TypeError, ValueError):
+            request._object_updated = None
+    return request._object_updated
+
+
+def list_condition(*models: Type[Model]) -> Callable:
+    def etag(request: Request, *args, **kwargs) -> str:
+        return sha1(get_response_cache_key(request, *models).encode()).hexdigest()
+
+    return method_decorator(condition(etag_func=etag))
+
+
+def detail_condition(model: Type[Model]) -> Callable:
+    def etag(request: Request, pk: str, *args, **kwargs) -> str | None:
+        updated = get_object_updated(request, model, pk)
+        if updated is None:
+            return None
+        return sha1(f'{updated.isoformat()}:{get_request_fingerprint(request)}'.encode()).hexdigest()
+
+    def last_modified(request: Request, pk: str, *args, **kwargs) -> datetime | None:
+        return get_object_updated(request, model, pk)
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified))
+
+
+def cache_response(*models: Type[Model]) -> Callable:
+    def decorator(method: Callable) -> Callable:
+        @wraps(method)
+        def wrapper(view, request: Request, *args, **kwargs) -> Response:
+            key = get_response_cache_key(request, *models)
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+                response[CACHE_HEADER] = 'HIT'
+                return response
+
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == HTTP_200_OK:
+                cache.set(key, response.data)
+            response[CACHE_HEADER] = 'MISS'
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,11 +1,27 @@
-from django_elasticsearch_dsl import Document
+from django_elasticsearch_dsl import Document, fields
 from django_elasticsearch_dsl.registries import registry
+from elasticsearch_dsl import analyzer, token_filter
 from .models import Item
 
+AUTOCOMPLETE_MAX_GRAM = 20
+
+# every prefix of every word is indexed, so a typed prefix is matched as a plain term
+autocomplete_analyzer = analyzer(
+    'autocomplete',
+    tokenizer='standard',
+    filter=['lowercase', token_filter('autocomplete_edge_ngram', 'edge_ngram', min_gram=1,
+                                      max_gram=AUTOCOMPLETE_MAX_GRAM)]
+)
+
 
 @registry.register_document
 class ItemDocument(Document):
+    name = fields.TextField(fields={
+        'autocomplete': fields.TextField(analyzer=autocomplete_analyzer, search_analyzer='standard'),
+    })
+
     class Index:
+        # an alias, manage.py search_reindex points it at a new timestamped index
         name = 'main_index'
         settings = {'number_of_shards': 1,
                     'number_of_replicas': 0}
@@ -13,7 +29,7 @@ class ItemDocument(Document):
     class Django:
         model = Item
         fields = [
-            'name',
+            'id',
             'price',
             'description'
         ]
@@ -0,0 +1,91 @@
+import json
+import logging
+import re
+from typing import AsyncIterator, Dict, Any, Iterable, List
+
+import redis
+from django.utils import timezone
+
+from cafe.models import Order
+from core.redis import get_redis, get_async_redis
+from core.settings import ORDER_EVENTS_MAXLEN, ORDER_EVENTS_KEEPALIVE
+
+logger = logging.getLogger(__name__)
+
+ORDER_EVENTS_STREAM = 'orders:events'
+ORDER_EVENTS_CHANNEL = 'orders:events'
+EVENT_ID_PATTERN = re.compile(r'^\d+-\d+$')
+
+
+def get_order_payload(order: Order, event: str) -> Dict[str, Any]:
+    return {
+        'event': event,
+        'id': order.pk,
+        'table_number': order.table_number,
+        'status': order.status,
+        'total_price': order.total_price,
+        'created': timezone.localtime(order.created).isoformat(),
+    }
+
+
+def publish_order_events(payloads: List[Dict[str, Any]]) -> None:
+    events = [json.dumps(payload, ensure_ascii=False) for payload in payloads]
+    try:
+        pipeline = get_redis().pipeline(transaction=False)
+        for data in events:
+            pipeline.xadd(ORDER_EVENTS_STREAM, {'data': data}, maxlen=ORDER_EVENTS_MAXLEN, approximate=True)
+        event_ids = pipeline.execute()
+        for event_id, data in zip(event_ids, events):
+            pipeline.publish(ORDER_EVENTS_CHANNEL, json.dumps({'event_id': event_id, 'data': data}))
+        pipeline.execute()
+    except redis.RedisError:
+        logger.exception('Failed to publish %s order events', len(events))
+
+
+def publish_order_event(payload: Dict[str, Any]) -> None:
+    publish_order_events([payload])
+
+
+def parse_event_id(event_id: str) -> tuple:
+    return tuple(map(int, event_id.split('-')))
+
+
+def format_event(event_id: str, data: str) -> str:
+    return f"id: {event_id}\nevent: {json.loads(data)['event']}\ndata: {data}\n\n"
+
+
+def is_event_wanted(data: str, statuses: Iterable[str], tables: Iterable[int]) -> bool:
+    payload = json.loads(data)
+    return (not statuses or payload['status'] in statuses) and (not tables or payload['table_number'] in tables)
+
+
+async def stream_order_events(last_event_id: str | None, statuses: Iterable[str],
+                              tables: Iterable[int]) -> AsyncIterator[str]:
+    connection = get_async_redis()
+    pubsub = connection.pubsub()
+    # subscribe before replaying, so nothing published in between is lost; duplicates are skipped by id
+    await pubsub.subscribe(ORDER_EVENTS_CHANNEL)
+    try:
+        yield 'retry: 3000\n\n'
+        last_seen = None
+        if last_event_id and EVENT_ID_PATTERN.match(last_event_id):
+            last_seen = parse_event_id(last_event_id)
+            for event_id, fields in await connection.xrange(ORDER_EVENTS_STREAM, min=f'({last_event_id}', max='+'):
+                last_seen = parse_event_id(event_id)
+                if is_event_wanted(fields['data'], statuses, tables):
+                    yield format_event(event_id, fields['data'])
+
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=ORDER_EVENTS_KEEPALIVE)
+            if message is None:
+                yield ': keepalive\n\n'
+                continue
+            event = json.loads(message['data'])
+            if last_seen is not None and parse_event_id(event['event_id']) <= last_seen:
+                continue
+            if is_event_wanted(event['data'], statuses, tables):
+                yield format_event(event['event_id'], event['data'])
+    finally:
+        await pubsub.unsubscribe(ORDER_EVENTS_CHANNEL)
+        await pubsub.aclose()
+        await connection.aclose()
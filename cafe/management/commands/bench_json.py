@@ -0,0 +1,47 @@
+import datetime
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import renderers
+
+from core.renderers import JSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = 'Compares the project JSON renderer with the DRF one on a synthetic list of orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000, help='Orders in one rendered list')
+        parser.add_argument('--repeat', type=int, default=50, help='How many times the list is rendered')
+
+    def handle(self, *args, **options):
+        now = timezone.localtime()
+        # what list views render: serializer output, plus a few values only the DRF encoder knows about
+        data = {
+            'count': options['orders'],
+            'next': None,
+            'generated': now,
+            'currency': gettext_lazy('руб.'),
+            'discount': Decimal('0.05'),
+            'results': [{
+                'url': f'http://localhost:8000/api/v1/orders/{pk}/',
+                'id': pk,
+                'table_number': pk % 20,
+                'items': [1, 2, 2, 3],
+                'total_price': 1400,
+                'status': 'PAID',
+                'created': (now - datetime.timedelta(minutes=pk)).isoformat(),
+            } for pk in range(options['orders'])],
+        }
+
+        default, fast = renderers.JSONRenderer(), JSONRenderer()
+        backend = 'orjson' if orjson else 'stdlib json (orjson is not installed)'
+        self.stdout.write(f'{options["orders"]} orders x {options["repeat"]}, backend: {backend}')
+        results = {}
+        for name, renderer in (('drf', default), ('project', fast)):
+            results[name] = timeit.timeit(lambda: renderer.render(data), number=options['repeat'])
+            self.stdout.write(f'{name:>8}: {results[name] / options["repeat"] * 1000:.2f} ms per render')
+        self.stdout.write(f'speedup: x{results["drf"] / results["project"]:.1f}')
@@ -0,0 +1,47 @@
+import time
+import timeit
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from elasticsearch import ApiError, TransportError
+
+from cafe.menu_index import MenuIndex, get_item_rows
+from cafe.models import Item
+from cafe.search import search_items_es
+
+QUERIES = ['борщ', 'суп грибной', 'сала', 'цезарь с курицей', 'картошка', 'пиво']
+
+
+class Command(BaseCommand):
+    help = 'Compares the in-process menu index with elasticsearch on the items in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--query', action='append', dest='queries', help='Query to search, can be repeated')
+        parser.add_argument('--repeat', type=int, default=100, help='How many times every query is searched')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or QUERIES + list(Item.objects.values_list('name', flat=True)[:4])
+        repeat = options['repeat']
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = MenuIndex()
+        index.load(get_item_rows())
+        elapsed = time.perf_counter() - start
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        self.stdout.write(f'{len(index)} items indexed in {elapsed * 1000:.1f} ms, {memory / 1024:.0f} KiB')
+
+        engines = [('menu', lambda query: index.search(query)[:10])]
+        try:
+            search_items_es(queries[0], 10)
+            engines.append(('es', lambda query: search_items_es(query, 10)))
+        except (ApiError, TransportError) as exc:
+            self.stderr.write(f'Elasticsearch is unavailable, only the menu index is measured: {exc}')
+
+        for query in queries:
+            timings = []
+            for name, search in engines:
+                per_query = timeit.timeit(lambda: search(query), number=repeat) / repeat
+                timings.append(f'{name} {per_query * 1000:.3f} ms')
+            self.stdout.write(f'{query!r:>24}: {", ".join(timings)}')
@@ -0,0 +1,33 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cafe.models import Order, DailyRevenue
+from cafe.services import get_order_days, refresh_daily_revenue, get_day_start
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the daily and the (date, hour, table) revenue rollups from the orders, '
+            'e.g. after orders were changed bypassing the signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date-from', type=date.fromisoformat, default=None, help='First day, YYYY-MM-DD')
+        parser.add_argument('--date-to', type=date.fromisoformat, default=None, help='Last day, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        date_from, date_to = options['date_from'], options['date_to']
+        if date_from and date_to and date_from > date_to:
+            raise CommandError('--date-from is after --date-to')
+
+        orders, rollups = Order.objects.all(), DailyRevenue.objects.all()
+        if date_from:
+            orders = orders.filter(created__gte=get_day_start(date_from))
+            rollups = rollups.filter(date__gte=date_from)
+        if date_to:
+            orders = orders.filter(created__lt=get_day_start(date_to + timedelta(days=1)))
+            rollups = rollups.filter(date__lte=date_to)
+        # days left with rollups but without orders are reset to zero
+        days = get_order_days(orders) | set(rollups.values_list('date', flat=True))
+
+        refresh_daily_revenue(days)
+        self.stdout.write(self.style.SUCCESS(f'Revenue rollups refreshed for {len(days)} days'))
@@ -0,0 +1,119 @@
+import time
+from datetime import datetime
+from typing import Iterator, List, Type
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django_elasticsearch_dsl import Document
+from django_elasticsearch_dsl.registries import registry
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk, parallel_bulk, scan
+from elasticsearch_dsl import Index
+
+from core.indexing import bump_search_version
+from core.settings import SEARCH_INDEX_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Builds every search index (or the ones of --models) into a new timestamped index, '
+            'checks the document count and atomically points the index alias at it')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='*', default=None, help='Models to reindex, e.g. cafe.Item')
+        parser.add_argument('--workers', type=int, default=4, help='Parallel bulk streams')
+        parser.add_argument('--chunk-size', type=int, default=SEARCH_INDEX_BATCH_SIZE,
+                            help='Documents per bulk request')
+        parser.add_argument('--keep-old', action='store_true', help="Don't delete the indices the alias pointed to")
+
+    def handle(self, *args, **options):
+        models = [apps.get_model(label) for label in options['models']] if options['models'] else None
+        for index in registry.get_indices(models):
+            documents = [document for document in registry.get_documents(models)
+                         if document._index._name == index._name]
+            self.reindex(index, documents, options['workers'], options['chunk_size'], options['keep_old'])
+
+    def get_actions(self, documents: List[Type[Document]], index_name: str, counter: List[int]) -> Iterator[dict]:
+        for document_class in documents:
+            document = document_class()
+            for instance in document.get_indexing_queryset():
+                if document.should_index_object(instance):
+                    counter[0] += 1
+                    yield {**document._prepare_action(instance, 'index'), '_index': index_name}
+
+    def get_reconcile_actions(self, documents: List[Type[Document]], client: Elasticsearch, index_name: str,
+                              since: datetime) -> Iterator[dict]:
+        indexed = {hit['_id'] for hit in scan(client, index=index_name, query={'_source': False})}
+        existing = set()
+        for document_class in documents:
+            document = document_class()
+            queryset = document.get_queryset()
+            existing.update(str(pk) for pk in queryset.values_list('pk', flat=True).iterator())
+            if any(field.name == 'updated' for field in document.django.model._meta.concrete_fields):
+                for instance in queryset.filter(updated__gte=since):
+                    if document.should_index_object(instance):
+                        yield {**document._prepare_action(instance, 'index'), '_index': index_name}
+        # documents of objects deleted after the build (or the previous pass) read them
+        for pk in sorted(indexed - existing):
+            yield {'_op_type': 'delete', '_index': index_name, '_id': pk}
+
+    def reconcile(self, documents: List[Type[Document]], client: Elasticsearch, index_name: str, since: datetime,
+                  chunk_size: int) -> int:
+        """
+        Brings index_name up to the database: objects changed since `since` are indexed again
+        and the documents of deleted objects are removed.
+        """
+        actions = self.get_reconcile_actions(documents, client, index_name, since)
+        done, _ = bulk(client, actions, chunk_size=chunk_size, ignore_status=(404,), refresh=True)
+        return done
+
+    def reindex(self, index: Index, documents: List[Type[Document]], workers: int, chunk_size: int,
+                keep_old: bool) -> None:
+        alias = index._name
+        client = index._get_connection()
+        new_name = f'{alias}-{timezone.now():%Y%m%d%H%M%S}'
+        started, start_time = timezone.now(), time.monotonic()
+
+        new_index = index.clone(name=new_name)
+        new_index.create()
+        self.stdout.write(f'{alias}: building {new_name}')
+
+        counter = [0]
+        try:
+            for ok, info in parallel_bulk(client, self.get_actions(documents, new_name, counter),
+                                          thread_count=workers, chunk_size=chunk_size):
+                if not ok:
+                    raise CommandError(f'Failed to index {info}')
+            new_index.refresh()
+            indexed = client.count(index=new_name)['count']
+            if indexed != counter[0]:
+                raise CommandError(f'{new_name} has {indexed} documents, expected {counter[0]}')
+            # changes made while the new index was built went to the old one, so are applied before the swap
+            reconciled = timezone.now()
+            caught_up = self.reconcile(documents, client, new_name, started, chunk_size)
+        except Exception:
+            new_index.delete(ignore_unavailable=True)
+            raise
+        elapsed = time.monotonic() - start_time
+
+        actions = [{'add': {'index': new_name, 'alias': alias}}]
+        old_indices = []
+        if client.indices.exists_alias(name=alias):
+            old_indices = list(client.indices.get_alias(name=alias))
+            actions = [{'remove': {'index': name, 'alias': alias}} for name in old_indices] + actions
+        elif client.indices.exists(index=alias):
+            # the index created before aliases were used takes the alias name, it is dropped in the same request
+            actions.insert(0, {'remove_index': {'index': alias}})
+        client.indices.update_aliases(actions=actions)
+        # and the ones made since, until the alias pointed at the new index
+        caught_up += self.reconcile(documents, client, new_name, reconciled, chunk_size)
+        for document in documents:
+            bump_search_version(document.django.model)
+
+        if old_indices and not keep_old:
+            client.indices.delete(index=','.join(old_indices), ignore_unavailable=True)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{alias} -> {new_name}: {counter[0]} documents in {elapsed:.1f}s '
+            f'({counter[0] / elapsed if elapsed else counter[0]:.0f} docs/sec), {caught_up} caught up'
+        ))
@@ -0,0 +1,260 @@
+import logging
+import math
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import redis
+
+from cafe.models import Item
+from core.redis import get_redis
+from core.settings import MENU_INDEX_CHANGELOG_SIZE, MENU_INDEX_COUNT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'menu_index:version'
+CHANGES_KEY = 'menu_index:changes'
+COUNT_KEY = 'menu_index:count'
+
+TOKEN_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]')
+STOP_WORDS = frozenset(['и', 'в', 'во', 'с', 'со', 'на', 'из', 'по', 'для', 'без', 'под', 'к', 'от', 'а', 'или'])
+# inflectional endings of nouns and adjectives, longest first
+ENDINGS = sorted([
+    'ыми', 'ими', 'ого', 'его', 'ому', 'ему', 'ами', 'ями', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой',
+    'ую', 'юю', 'ых', 'их', 'ым', 'им', 'ом', 'ем', 'ов', 'ев', 'ей', 'ам', 'ям', 'ах', 'ях', 'ью',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+MIN_STEM = 3
+NAME_WEIGHT, DESCRIPTION_WEIGHT = 2, 1
+PREFIX_WEIGHT, FUZZY_WEIGHT = 0.7, 0.5
+
+
+def stem(word: str) -> str:
+    if CYRILLIC_RE.search(word):
+        for ending in ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+                return word[:-len(ending)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    return [stem(word) for word in TOKEN_RE.findall(text.lower().replace('ё', 'е')) if word not in STOP_WORDS]
+
+
+def get_max_edits(term: str) -> int:
+    # what elasticsearch fuzziness AUTO allows
+    return 0 if len(term) < 3 else 1 if len(term) < 6 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class MenuIndex:
+    """
+    Inverted index of item names and descriptions, kept in the memory of every process.
+
+    Postings are arrays of item ids with the term weight in the item, terms are kept sorted
+    for prefix lookups. Items are added and removed one by one, so changes don't need a rebuild.
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self._docs: Dict[int, Tuple[str, int, str]] = {}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._terms: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, pk: int, name: str, price: int, description: str) -> None:
+        self.remove(pk)
+        weights = Counter()
+        for term in tokenize(name):
+            weights[term] += NAME_WEIGHT
+        for term in tokenize(description):
+            weights[term] += DESCRIPTION_WEIGHT
+
+        self._docs[pk] = (name, price, description)
+        self._doc_terms[pk] = tuple(weights)
+        for term, weight in weights.items():
+            if term not in self._postings:
+                term = sys.intern(term)
+                self._postings[term] = (array('I'), array('H'))
+                insort(self._terms, term)
+            ids, term_weights = self._postings[term]
+            ids.append(pk)
+            term_weights.append(min(weight, 0xFFFF))
+
+    def remove(self, pk: int) -> None:
+        if pk not in self._docs:
+            return
+        del self._docs[pk]
+        for term in self._doc_terms.pop(pk):
+            ids, weights = self._postings[term]
+            position = ids.index(pk)
+            del ids[position], weights[position]
+            if not ids:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def get_candidates(self, token: str) -> Dict[str, float]:
+        candidates = {}
+        if token in self._postings:
+            candidates[token] = 1.0
+        start = bisect_left(self._terms, token)
+        for term in self._terms[start:]:
+            if not term.startswith(token):
+                break
+            candidates.setdefault(term, PREFIX_WEIGHT)
+        if max_edits := get_max_edits(token):
+            for term in self._terms:
+                if term not in candidates and edit_distance(token, term, max_edits) <= max_edits:
+                    candidates[term] = FUZZY_WEIGHT
+        return candidates
+
+    def search(self, query: str) -> List[Tuple[float, int]]:
+        """
+        Returns (score, id) of every item matching any word of query, best first.
+        Words match whole terms, their beginnings or terms a few typos away.
+        """
+        scores = Counter()
+        total = len(self._docs)
+        for token in set(tokenize(query)):
+            token_scores = {}
+            for term, boost in self.get_candidates(token).items():
+                ids, weights = self._postings[term]
+                idf = math.log(1 + (total - len(ids) + 0.5) / (len(ids) + 0.5))
+                for pk, weight in zip(ids, weights):
+                    # one query word counts once per item, by its best matching term
+                    token_scores[pk] = max(token_scores.get(pk, 0), boost * idf * weight)
+            scores.update(token_scores)
+        return sorted(((round(score, 6), pk) for pk, score in scores.items()), key=lambda hit: (-hit[0], hit[1]))
+
+    def get_row(self, pk: int) -> Dict:
+        name, price, description = self._docs[pk]
+        return {'id': pk, 'name': name, 'price': price, 'description': description}
+
+    def load(self, rows: Iterable[Tuple[int, str, int, str]]) -> None:
+        for row in rows:
+            self.add(*row)
+
+
+_index: MenuIndex | None = None
+# the index is changed in place, so it is searched and updated under the lock
+_lock = threading.RLock()
+
+
+def get_item_rows(pks: Iterable[int] | None = None) -> Iterable[Tuple[int, str, int, str]]:
+    queryset = Item.objects.all() if pks is None else Item.objects.filter(pk__in=pks)
+    return queryset.values_list('id', 'name', 'price', 'description').iterator()
+
+
+def build_menu_index(version: int = 0) -> MenuIndex:
+    index = MenuIndex(version)
+    index.load(get_item_rows())
+    return index
+
+
+def record_item_changes(pks: List[int]) -> None:
+    connection = get_redis()
+    try:
+        version = connection.incrby(VERSION_KEY, len(pks))
+        pipeline = connection.pipeline()
+        pipeline.zadd(CHANGES_KEY, {f'{version - offset}:{pk}': version - offset for offset, pk in enumerate(pks)})
+        pipeline.zremrangebyrank(CHANGES_KEY, 0, -MENU_INDEX_CHANGELOG_SIZE - 1)
+        pipeline.delete(COUNT_KEY)
+        pipeline.execute()
+    except redis.RedisError:
+        logger.exception('Failed to record changes of items %s for the menu index', pks)
+
+
+def get_item_count() -> int:
+    """
+    Returns the number of items, counted in the database again only after items change
+    or MENU_INDEX_COUNT_TIMEOUT passes. Unlike get_menu_index() it never loads the items.
+    """
+    connection = get_redis()
+    try:
+        count = connection.get(COUNT_KEY)
+    except redis.RedisError:
+        logger.warning('Item count is unavailable, counting in the database', exc_info=True)
+        return Item.objects.count()
+    if count is None:
+        count = Item.objects.count()
+        try:
+            connection.set(COUNT_KEY, count, ex=MENU_INDEX_COUNT_TIMEOUT)
+        except redis.RedisError:
+            logger.warning('Failed to cache the item count', exc_info=True)
+    return int(count)
+
+
+def get_menu_index() -> MenuIndex:
+    """
+    Returns the index of this process, brought up to the version shared through Redis.
+    Only the items changed since the local version are read again, unless the changelog
+    no longer has all of them.
+    """
+    global _index
+    with _lock:
+        try:
+            connection = get_redis()
+            version = int(connection.get(VERSION_KEY) or 0)
+            changes = []
+            if _index is not None and _index.version < version:
+                changes = connection.zrangebyscore(CHANGES_KEY, _index.version + 1, version)
+        except redis.RedisError:
+            logger.warning('Menu index version is unavailable, serving the local index', exc_info=True)
+            if _index is None:
+                _index = build_menu_index()
+            return _index
+
+        if _index is None or _index.version > version or len(changes) < version - _index.version:
+            _index = build_menu_index(version)
+        elif changes:
+            pks = {int(change.split(':')[1]) for change in changes}
+            for pk in pks:
+                _index.remove(pk)
+            _index.load(get_item_rows(pks))
+            _index.version = version
+        return _index
+
+
+def search_menu(query: str) -> List[Dict]:
+    with _lock:
+        index = get_menu_index()
+        return [{**index.get_row(pk), 'score': score} for score, pk in index.search(query)]
+
+
+def complete_menu(prefix: str, size: int) -> List[Dict]:
+    """
+    Returns id, name and price of the best matching items whose name words start with the words of prefix.
+    """
+    words = tokenize(prefix)
+    rows = []
+    with _lock:
+        index = get_menu_index()
+        for _, pk in index.search(prefix):
+            row = index.get_row(pk)
+            name = tokenize(row['name'])
+            if all(any(term.startswith(word) for term in name) for word in words):
+                rows.append({'id': pk, 'name': row['name'], 'price': row['price']})
+                if len(rows) == size:
+                    break
+    return rows
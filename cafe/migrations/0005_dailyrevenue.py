@@ -0,0 +1,54 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:42
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+STATUS_FIELDS = {
+    'WAIT': ('wait_count', 'wait_total'),
+    'READY': ('ready_count', 'ready_total'),
+    'PAID': ('paid_count', 'revenue'),
+}
+
+
+def fill_daily_revenue(apps, schema_editor):
+    Order = apps.get_model('cafe', 'Order')
+    DailyRevenue = apps.get_model('cafe', 'DailyRevenue')
+
+    rows = {}
+    groups = Order.objects.annotate(
+        day=TruncDate('created', tzinfo=timezone.get_current_timezone())
+    ).values('day', 'status').annotate(count=Count('id'), total=Sum('total_price')).order_by()
+    for group in groups:
+        row = rows.setdefault(group['day'], DailyRevenue(date=group['day']))
+        count_field, total_field = STATUS_FIELDS[group['status']]
+        setattr(row, count_field, group['count'])
+        setattr(row, total_field, group['total'])
+        row.orders_count += group['count']
+    DailyRevenue.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0004_item_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='Дата')),
+                ('orders_count', models.BigIntegerField(default=0, verbose_name='Количество заказов')),
+                ('wait_count', models.BigIntegerField(default=0, verbose_name='Заказов в ожидании')),
+                ('wait_total', models.BigIntegerField(default=0, verbose_name='Сумма заказов в ожидании')),
+                ('ready_count', models.BigIntegerField(default=0, verbose_name='Готовых заказов')),
+                ('ready_total', models.BigIntegerField(default=0, verbose_name='Сумма готовых заказов')),
+                ('paid_count', models.BigIntegerField(default=0, verbose_name='Оплаченных заказов')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+            ],
+        ),
+        migrations.RunPython(fill_daily_revenue, migrations.RunPython.noop),
+    ]
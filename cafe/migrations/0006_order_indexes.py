@@ -0,0 +1,27 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:44
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('cafe', '0005_dailyrevenue'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['-created', '-id'], name='cafe_order_created_id_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['status', '-created'], name='cafe_order_status_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='order',
+            index=models.Index(fields=['table_number', '-created'], name='cafe_order_table_created_idx'),
+        ),
+    ]
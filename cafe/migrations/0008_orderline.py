@@ -0,0 +1,54 @@
+# Generated by Django 5.1.5 on 2026-10-18 08:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0007_item_updated_order_updated'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1, verbose_name='Количество')),
+                ('price', models.PositiveIntegerField(verbose_name='Цена за единицу')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='cafe.item', verbose_name='Блюдо')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='cafe.order', verbose_name='Заказ')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='orderline',
+            constraint=models.UniqueConstraint(fields=('order', 'item'), name='cafe_orderline_order_item_unique'),
+        ),
+        # existing orders keep their totals, lines get the current item price as the snapshot
+        migrations.RunSQL(
+            sql="""
+                INSERT INTO cafe_orderline (order_id, item_id, quantity, price)
+                SELECT order_items.order_id, order_items.item_id, 1, item.price
+                FROM cafe_order_items AS order_items
+                INNER JOIN cafe_item AS item ON item.id = order_items.item_id
+                ORDER BY order_items.id
+            """,
+            reverse_sql="""
+                INSERT INTO cafe_order_items (order_id, item_id)
+                SELECT order_id, item_id FROM cafe_orderline ORDER BY id
+            """,
+        ),
+        migrations.RemoveField(
+            model_name='order',
+            name='items',
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='items',
+            field=models.ManyToManyField(related_name='orders', through='cafe.OrderLine', to='cafe.item', verbose_name='Заказы'),
+        ),
+    ]
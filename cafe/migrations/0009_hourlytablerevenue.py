@@ -0,0 +1,46 @@
+# Generated by Django 5.1.5 on 2026-10-18 09:17
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, ExtractHour
+from django.utils import timezone
+
+
+def fill_hourly_table_revenue(apps, schema_editor):
+    Order = apps.get_model('cafe', 'Order')
+    HourlyTableRevenue = apps.get_model('cafe', 'HourlyTableRevenue')
+
+    groups = Order.objects.filter(status='PAID').annotate(
+        day=TruncDate('created', tzinfo=timezone.get_current_timezone()),
+        hour=ExtractHour('created', tzinfo=timezone.get_current_timezone()),
+    ).values('day', 'hour', 'table_number').annotate(count=Count('id'), total=Sum('total_price')).order_by()
+    HourlyTableRevenue.objects.bulk_create((
+        HourlyTableRevenue(date=group['day'], hour=group['hour'], table_number=group['table_number'],
+                           paid_count=group['count'], revenue=group['total'])
+        for group in groups.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cafe', '0008_orderline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HourlyTableRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('hour', models.PositiveSmallIntegerField(verbose_name='Час')),
+                ('table_number', models.PositiveIntegerField(verbose_name='Номер стола')),
+                ('paid_count', models.BigIntegerField(default=0, verbose_name='Оплаченных заказов')),
+                ('revenue', models.BigIntegerField(default=0, verbose_name='Выручка')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'hour', 'table_number'), name='cafe_hourlytablerevenue_date_hour_table_unique')],
+            },
+        ),
+        migrations.RunPython(fill_hourly_table_revenue, migrations.RunPython.noop),
+    ]
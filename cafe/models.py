@@ -1,23 +1,65 @@
-from typing import List
+from collections import Counter
+from typing import List, Dict, Any
 
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
 
 
 class OrderManager(models.Manager):
     @staticmethod
-    def calc_price(items: List['Item']) -> int:
-        return sum(item.price for item in items)
+    def calc_lines_price(lines: List['OrderLine']) -> int:
+        return sum(line.quantity * line.price for line in lines)
+
+    @staticmethod
+    def make_lines(order: 'Order', items: List['Item']) -> List['OrderLine']:
+        quantities = Counter(item.pk for item in items)
+        prices = {item.pk: item.price for item in items}
+        return [OrderLine(order=order, item_id=pk, quantity=quantity, price=prices[pk])
+                for pk, quantity in quantities.items()]
+
+    def set_lines(self, order: 'Order', items: List['Item']) -> List['OrderLine']:
+        with transaction.atomic(using=self._db):
+            order.lines.all().delete()
+            return OrderLine.objects.using(self._db).bulk_create(self.make_lines(order, items))
+
+    def validate(self, order: 'Order') -> None:
+        # the only invariants callers can break, full_clean() would also validate every other field
+        errors = {}
+        if not isinstance(order.table_number, int) or order.table_number < 0:
+            errors['table_number'] = ['Номер стола должен быть неотрицательным числом']
+        if order.status not in self.model.Status.values:
+            errors['status'] = [f'Значения {order.status!r} нет среди допустимых вариантов']
+        if errors:
+            raise ValidationError(errors)
 
     def create(self, table_number: int, items: List['Item'], status: str | None = None) -> 'Order':
         if status:
-            order = self.model(table_number=table_number, total_price=self.calc_price(items), status=status)
+            order = self.model(table_number=table_number, status=status)
         else:
-            order = self.model(table_number=table_number, total_price=self.calc_price(items))
-        order.full_clean()
-        order.save(using=self._db)
-        order.items.set(items)
+            order = self.model(table_number=table_number)
+        lines = self.make_lines(order, items)
+        order.total_price = self.calc_lines_price(lines)
+        self.validate(order)
+        with transaction.atomic(using=self._db):
+            order.save(force_insert=True, using=self._db)
+            OrderLine.objects.using(self._db).bulk_create(lines)
         return order
 
+    def create_many(self, orders_data: List[Dict[str, Any]]) -> List['Order']:
+        orders, lines = [], []
+        for data in orders_data:
+            order = self.model(table_number=data['table_number'], status=data.get('status') or self.model.Status.WAIT)
+            order_lines = self.make_lines(order, data['items'])
+            order.total_price = self.calc_lines_price(order_lines)
+            self.validate(order)
+            orders.append(order)
+            lines.extend(order_lines)
+        with transaction.atomic(using=self._db):
+            self.bulk_create(orders)
+            # the lines were built before the orders had ids, bulk_create copies them over
+            OrderLine.objects.using(self._db).bulk_create(lines)
+        return orders
+
 
 class Order(models.Model):
     class Status(models.TextChoices):
@@ -25,19 +67,81 @@ class Order(models.Model):
         READY = "READY", "Готово"
         PAID = "PAID", "Оплачено"
 
+    # target status -> statuses an order may move from
+    TRANSITIONS = {
+        Status.READY: [Status.WAIT],
+        Status.PAID: [Status.READY],
+    }
+
     table_number = models.PositiveIntegerField(verbose_name='Номер стола')
-    items = models.ManyToManyField('Item', related_name='orders', verbose_name='Заказы')
+    items = models.ManyToManyField('Item', through='OrderLine', related_name='orders', verbose_name='Заказы')
     total_price = models.PositiveIntegerField(verbose_name='Итоговая цена')
     status = models.CharField(max_length=5, choices=Status, default=Status.WAIT, verbose_name='Статус')
     created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
 
     objects = OrderManager()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created', '-id'], name='cafe_order_created_id_idx'),
+            models.Index(fields=['status', '-created'], name='cafe_order_status_created_idx'),
+            models.Index(fields=['table_number', '-created'], name='cafe_order_table_created_idx'),
+        ]
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey('Order', on_delete=models.CASCADE, related_name='lines', verbose_name='Заказ')
+    item = models.ForeignKey('Item', on_delete=models.CASCADE, related_name='order_lines', verbose_name='Блюдо')
+    quantity = models.PositiveIntegerField(default=1, verbose_name='Количество')
+    price = models.PositiveIntegerField(verbose_name='Цена за единицу')
+
+    class Meta:
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'item'], name='cafe_orderline_order_item_unique'),
+        ]
+
 
 class Item(models.Model):
     name = models.CharField(max_length=128, verbose_name='Название блюда')
     price = models.PositiveIntegerField(verbose_name='Цена')
     description = models.TextField(blank=True, verbose_name='Описание блюда')
+    updated = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
+
+
+class DailyRevenue(models.Model):
+    STATUS_FIELDS = {
+        Order.Status.WAIT: ('wait_count', 'wait_total'),
+        Order.Status.READY: ('ready_count', 'ready_total'),
+        Order.Status.PAID: ('paid_count', 'revenue'),
+    }
+    COUNTERS = ['orders_count', 'wait_count', 'wait_total', 'ready_count', 'ready_total', 'paid_count', 'revenue']
+
+    date = models.DateField(unique=True, verbose_name='Дата')
+    orders_count = models.BigIntegerField(default=0, verbose_name='Количество заказов')
+    wait_count = models.BigIntegerField(default=0, verbose_name='Заказов в ожидании')
+    wait_total = models.BigIntegerField(default=0, verbose_name='Сумма заказов в ожидании')
+    ready_count = models.BigIntegerField(default=0, verbose_name='Готовых заказов')
+    ready_total = models.BigIntegerField(default=0, verbose_name='Сумма готовых заказов')
+    paid_count = models.BigIntegerField(default=0, verbose_name='Оплаченных заказов')
+    revenue = models.BigIntegerField(default=0, verbose_name='Выручка')
+
+
+class HourlyTableRevenue(models.Model):
+    COUNTERS = ['paid_count', 'revenue']
+
+    date = models.DateField(verbose_name='Дата')
+    hour = models.PositiveSmallIntegerField(verbose_name='Час')
+    table_number = models.PositiveIntegerField(verbose_name='Номер стола')
+    paid_count = models.BigIntegerField(default=0, verbose_name='Оплаченных заказов')
+    revenue = models.BigIntegerField(default=0, verbose_name='Выручка')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'hour', 'table_number'],
+                                    name='cafe_hourlytablerevenue_date_hour_table_unique'),
+        ]
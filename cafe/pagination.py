@@ -0,0 +1,100 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime
+from typing import Any, List, Tuple
+
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class OrderKeysetPagination(BasePagination):
+    """
+    Keyset pagination over ('-created', '-id').
+
+    Every page is a single indexed range scan, so page 10 000 costs the same as page 1.
+    The total count is an extra COUNT(*) and can be turned off with `?count=false`.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view=None) -> List[Any]:
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = queryset.count() if self.get_include_count(request) else None
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            created, pk = position
+            queryset = queryset.filter(Q(created__lt=created) | Q(created=created, id__lt=pk))
+
+        results = list(queryset.order_by('-created', '-id')[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_page_size(self, request: Request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_include_count(self, request: Request) -> bool:
+        return request.query_params.get(self.count_query_param, 'true').lower() not in ('0', 'false', 'no')
+
+    def decode_cursor(self, request: Request) -> Tuple[datetime, int] | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            created, pk = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split('|')
+            return datetime.fromisoformat(created), int(pk)
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row: Any) -> str:
+        created, pk = (row['created'], row['id']) if isinstance(row, dict) else (row.created, row.id)
+        encoded = urlsafe_b64encode(f'{created.isoformat()}|{pk}'.encode('ascii')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data: List[Any]) -> Response:
+        response = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response = {'count': self.count, **response}
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {
+                    'type': 'integer',
+                    'example': 123,
+                },
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                    'example': 'http://api.example.org/accounts/?{cursor_query_param}=cD00ODY%3D'.format(
+                        cursor_query_param=self.cursor_query_param)
+                },
+                'results': schema,
+            },
+        }
@@ -0,0 +1,145 @@
+import json
+import logging
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from hashlib import sha1
+from math import isfinite
+from typing import Any, Dict, List, Tuple
+
+from django.core.cache import cache
+from elasticsearch import ApiError, TransportError
+from rest_framework.exceptions import ValidationError
+
+from cafe.documents import ItemDocument, AUTOCOMPLETE_MAX_GRAM
+from cafe.menu_index import get_item_count, search_menu, complete_menu
+from cafe.models import Item
+from core.indexing import get_search_version
+from core.settings import AUTOCOMPLETE_CACHE_TIMEOUT, MENU_INDEX_MAX_ITEMS, MENU_SEARCH_ES_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ['name', 'description']
+INDEXED_FIELDS = list(ItemDocument._fields)
+AUTOCOMPLETE_FIELDS = ['id', 'name', 'price']
+AUTOCOMPLETE_MAX_SIZE = 20
+SEARCH_MAX_SIZE = 100
+# index.max_result_window, from + size can't go past it
+SEARCH_MAX_WINDOW = 10000
+
+
+def encode_search_after(sort: List[Any]) -> str:
+    return urlsafe_b64encode(json.dumps(sort).encode()).decode('ascii')
+
+
+def decode_search_after(value: str) -> List[Any]:
+    try:
+        sort = json.loads(urlsafe_b64decode(value.encode('ascii')))
+    except (BinasciiError, UnicodeError, ValueError):
+        sort = None
+    # the sort values of a hit: its score and its id
+    if (not isinstance(sort, list) or len(sort) != 2 or not isinstance(sort[0], (int, float))
+            or not isfinite(sort[0]) or not isinstance(sort[1], int)):
+        raise ValidationError('Неверный курсор')
+    return sort
+
+
+def search_items_es(match: str, size: int, offset: int = 0,
+                    search_after: List[Any] | None = None,
+                    timeout: float | None = None) -> Tuple[int, List[Dict[str, Any]], List[Any] | None]:
+    search = ItemDocument.search().query(
+        'multi_match', query=match, fields=SEARCH_FIELDS
+    ).sort(
+        {'_score': {'order': 'desc'}}, {'id': {'order': 'asc', 'unmapped_type': 'long'}}
+    ).source(INDEXED_FIELDS)
+    if timeout is not None:
+        search = search.using(ItemDocument._get_connection().options(request_timeout=timeout, max_retries=0))
+    if search_after:
+        search = search.extra(search_after=search_after)
+    response = search[offset:offset + size].execute()
+
+    rows = [{**hit.to_dict(), 'id': int(hit.meta.id), 'score': hit.meta.score} for hit in response]
+    last_sort = list(response.hits[-1].meta.sort) if len(response.hits) else None
+    return response.hits.total.value, rows, last_sort
+
+
+def search_items_local(match: str, size: int, offset: int = 0,
+                       search_after: List[Any] | None = None) -> Tuple[int, List[Dict[str, Any]], List[Any] | None]:
+    rows = search_menu(match)
+    total = len(rows)
+    if search_after:
+        try:
+            after = (-float(search_after[0]), int(search_after[1]))
+        except (TypeError, ValueError):
+            raise ValidationError('Неверный курсор')
+        rows = [row for row in rows if (-row['score'], row['id']) > after]
+    rows = rows[offset:offset + size]
+    return total, rows, [rows[-1]['score'], rows[-1]['id']] if rows else None
+
+
+def is_small_catalog() -> bool:
+    # decided by the cached count, so the menu index is only built in processes that search it
+    return get_item_count() <= MENU_INDEX_MAX_ITEMS
+
+
+def search_items(match: str, size: int, offset: int = 0,
+                 search_after: List[Any] | None = None) -> Tuple[int, List[Dict[str, Any]], List[Any] | None]:
+    """
+    Returns the total number of hits, one page of hits built from the indexed fields and
+    the sort values of the last hit to continue from.
+
+    Small catalogs are searched by the in-process menu index; bigger ones by elasticsearch,
+    falling back to the menu index when it fails or doesn't answer in MENU_SEARCH_ES_TIMEOUT.
+    """
+    if is_small_catalog():
+        return search_items_local(match, size, offset, search_after)
+    try:
+        return search_items_es(match, size, offset, search_after, timeout=MENU_SEARCH_ES_TIMEOUT)
+    except (ApiError, TransportError):
+        logger.warning('Elasticsearch search failed, searching the menu index', exc_info=True)
+        return search_items_local(match, size, offset, search_after)
+
+
+def hydrate_items(rows: List[Dict[str, Any]], columns: List[str]) -> List[Dict[str, Any]]:
+    missing = [column for column in columns if column not in INDEXED_FIELDS]
+    if not missing or not rows:
+        return rows
+    items = Item.objects.filter(id__in=[row['id'] for row in rows]).values('id', *missing)
+    items = {item['id']: item for item in items}
+    # hits of items deleted after they were indexed are dropped
+    return [{**row, **items[row['id']]} for row in rows if row['id'] in items]
+
+
+def normalize_prefix(prefix: str) -> str:
+    # words longer than the longest indexed n-gram can't match
+    return ' '.join(word[:AUTOCOMPLETE_MAX_GRAM] for word in prefix.lower().split())
+
+
+def autocomplete_items(prefix: str, size: int) -> List[Dict[str, Any]]:
+    """
+    Returns id, name and price of the items whose name words start with the words of prefix.
+    Small catalogs are completed by the menu index, like search_items() does it. Elasticsearch
+    results are cached per prefix until the index gets a change or AUTOCOMPLETE_CACHE_TIMEOUT passes.
+    When elasticsearch fails, the suggestions come from the menu index and are not cached.
+    """
+    prefix = normalize_prefix(prefix)
+    if is_small_catalog():
+        return complete_menu(prefix, size)
+    key = f'autocomplete:{get_search_version(Item)}:{size}:{sha1(prefix.encode()).hexdigest()}'
+    rows = cache.get(key)
+    if rows is not None:
+        return rows
+    search = ItemDocument.search().using(
+        ItemDocument._get_connection().options(request_timeout=MENU_SEARCH_ES_TIMEOUT, max_retries=0)
+    ).query(
+        'match', **{'name.autocomplete': {'query': prefix, 'operator': 'and'}}
+    ).sort(
+        {'_score': {'order': 'desc'}}, {'id': {'order': 'asc', 'unmapped_type': 'long'}}
+    ).source(AUTOCOMPLETE_FIELDS)[:size]
+    try:
+        response = search.execute()
+    except (ApiError, TransportError):
+        logger.warning('Elasticsearch autocomplete failed, completing from the menu index', exc_info=True)
+        return complete_menu(prefix, size)
+    rows = [{**hit.to_dict(), 'id': int(hit.meta.id)} for hit in response]
+    cache.set(key, rows, timeout=AUTOCOMPLETE_CACHE_TIMEOUT)
+    return rows
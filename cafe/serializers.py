@@ -1,13 +1,24 @@
 import traceback
+from typing import Any, Dict, Iterable, List
 
+from django.db import transaction
+from django.db.models import Model, QuerySet
 from rest_framework import serializers
 from rest_framework.serializers import raise_errors_on_nested_writes
+from rest_framework.settings import api_settings
 from rest_framework.utils import model_meta
 
 from cafe.models import Order, Item
+from cafe.search import SEARCH_MAX_SIZE, SEARCH_MAX_WINDOW, AUTOCOMPLETE_FIELDS, AUTOCOMPLETE_MAX_SIZE, \
+    decode_search_after
+from cafe.services import ORDER_FILTERS, get_revenue
+from core.serializers import HyperlinkedIdentityField, SparseFieldsMixin
+from core.settings import REVENUE_REPORT_MAX_DAYS, ORDERS_BULK_MAX
 
 
-class ItemSerializer(serializers.HyperlinkedModelSerializer):
+class ItemSerializer(SparseFieldsMixin, serializers.HyperlinkedModelSerializer):
+    serializer_url_field = HyperlinkedIdentityField
+
     class Meta:
         model = Item
         fields = ['id', 'url', 'name', 'price', 'description']
@@ -25,12 +36,6 @@ class ItemSerializer(serializers.HyperlinkedModelSerializer):
 
         instance.save()
 
-        if 'price' in validated_data.keys():
-
-            for order in instance.orders.all():
-                order.total_price = Order.objects.calc_price(order.items.all())
-                order.save()
-
         for attr, value in m2m_fields:
             field = getattr(instance, attr)
             field.set(value)
@@ -38,8 +43,52 @@ class ItemSerializer(serializers.HyperlinkedModelSerializer):
         return instance
 
 
-class OrderSerializer(serializers.HyperlinkedModelSerializer):
-    items = serializers.PrimaryKeyRelatedField(queryset=Item.objects.all(), many=True)
+class ManyPrimaryKeyField(serializers.ListField):
+    child = serializers.IntegerField(min_value=1)
+    default_error_messages = {
+        'does_not_exist': 'Объекты с id {pk_values} не существуют.',
+    }
+
+    def __init__(self, queryset: QuerySet, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def get_objects(self, pks: Iterable[int]) -> Dict[int, Model]:
+        return self.queryset.in_bulk(set(pks))
+
+    def resolve(self, pks: List[int], objects: Dict[int, Model]) -> List[Model]:
+        # objects may be fetched once for many lists, as the bulk create does
+        missing = sorted(set(pks) - objects.keys())
+        if missing:
+            self.fail('does_not_exist', pk_values=', '.join(map(str, missing)))
+        return [objects[pk] for pk in pks]
+
+    def to_internal_value(self, data) -> List[Model]:
+        pks = super().to_internal_value(data)
+        return self.resolve(pks, self.get_objects(pks))
+
+
+class OrderItemsField(ManyPrimaryKeyField):
+    def __init__(self, **kwargs):
+        super().__init__(queryset=Item.objects.only('id', 'price'), **kwargs)
+
+    # item columns rendered instead of ids with ?expand=items
+    expand_fields = ['id', 'name', 'price']
+
+    def get_attribute(self, instance: Order) -> List[int] | List[Dict[str, Any]]:
+        if self.context.get('expand_items'):
+            return [{field: getattr(line.item, field) for field in self.expand_fields}
+                    for line in instance.lines.all() for _ in range(line.quantity)]
+        return [line.item_id for line in instance.lines.all() for _ in range(line.quantity)]
+
+    def to_representation(self, data: List[int] | List[Dict[str, Any]]) -> List[int] | List[Dict[str, Any]]:
+        return list(data)
+
+
+class OrderSerializer(SparseFieldsMixin, serializers.HyperlinkedModelSerializer):
+    serializer_url_field = HyperlinkedIdentityField
+
+    items = OrderItemsField()
     total_price = serializers.ReadOnlyField()
 
     class Meta:
@@ -84,6 +133,7 @@ class OrderSerializer(serializers.HyperlinkedModelSerializer):
     def update(self, instance, validated_data):
         raise_errors_on_nested_writes('update', self, validated_data)
         info = model_meta.get_field_info(instance)
+        items = validated_data.pop('items', None)
 
         m2m_fields = []
         for attr, value in validated_data.items():
@@ -92,20 +142,108 @@ class OrderSerializer(serializers.HyperlinkedModelSerializer):
             else:
                 setattr(instance, attr, value)
 
-        instance.save()
+        with transaction.atomic():
+            if items is not None:
+                lines = Order.objects.set_lines(instance, items)
+                instance.total_price = Order.objects.calc_lines_price(lines)
+            instance.save()
 
         for attr, value in m2m_fields:
             field = getattr(instance, attr)
             field.set(value)
-            if attr == 'items':
-                setattr(instance, 'total_price', Order.objects.calc_price(value))
 
         return instance
 
 
+class ItemSearchSerializer(ItemSerializer):
+    score = serializers.FloatField(read_only=True)
+    updated = serializers.DateTimeField(read_only=True)
+
+    class Meta(ItemSerializer.Meta):
+        fields = [*ItemSerializer.Meta.fields, 'updated', 'score']
+        # fields built from the search index; the rest are read from the database on request
+        default_fields = [*ItemSerializer.Meta.fields, 'score']
+
+
+class ItemSearchQuerySerializer(serializers.Serializer):
+    match = serializers.CharField()
+    size = serializers.IntegerField(min_value=1, max_value=SEARCH_MAX_SIZE, default=api_settings.PAGE_SIZE)
+    search_after = serializers.CharField(required=False, allow_blank=True)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.IntegerField(min_value=0, default=0)
+        return fields
+
+    def validate_search_after(self, value: str) -> List[Any]:
+        return decode_search_after(value) if value else []
+
+    def validate(self, attrs):
+        if 'search_after' in attrs and attrs['from']:
+            raise serializers.ValidationError({'from': 'from нельзя использовать вместе с search_after'})
+        if attrs['from'] + attrs['size'] > SEARCH_MAX_WINDOW:
+            raise serializers.ValidationError(
+                {'from': f'from + size не может превышать {SEARCH_MAX_WINDOW}, используйте search_after'})
+        return attrs
+
+
+class ItemAutocompleteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Item
+        fields = AUTOCOMPLETE_FIELDS
+
+
+class ItemAutocompleteQuerySerializer(serializers.Serializer):
+    prefix = serializers.CharField(max_length=Item._meta.get_field('name').max_length)
+    size = serializers.IntegerField(min_value=1, max_value=AUTOCOMPLETE_MAX_SIZE, default=10)
+
+
+class OrderBulkCreateSerializer(serializers.ModelSerializer):
+    items = serializers.ListField(child=serializers.IntegerField(min_value=1))
+
+    class Meta:
+        model = Order
+        fields = ['table_number', 'items', 'status']
+
+
+TRANSITION_STATUS_CHOICES = [(status, status.label) for status in Order.TRANSITIONS]
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=TRANSITION_STATUS_CHOICES)
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False,
+                                allow_empty=False, max_length=ORDERS_BULK_MAX)
+    filter = serializers.DictField(required=False, allow_empty=False)
+
+    def validate_filter(self, value: Dict[str, Any]) -> Dict[str, Any]:
+        # an unknown key would be ignored by filter_orders and the filter would select every order
+        unknown = sorted(set(value) - set(ORDER_FILTERS))
+        if unknown:
+            raise serializers.ValidationError(
+                f'Неизвестные фильтры: {", ".join(unknown)}. Доступны: {", ".join(ORDER_FILTERS)}')
+        return value
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'filter' not in attrs:
+            raise serializers.ValidationError({'detail': 'Укажите ids или filter'})
+        return attrs
+
+
 class CalcRevenueSerializer(serializers.Serializer):
     date = serializers.DateField(required=True)
 
     def create(self, validated_data):
-        orders = Order.objects.filter(status='PAID', created__date=validated_data['date'])
-        return sum(order.total_price for order in orders)
+        return get_revenue(validated_data['date'])
+
+
+class RevenueReportSerializer(serializers.Serializer):
+    date_from = serializers.DateField(required=True)
+    date_to = serializers.DateField(required=True)
+
+    def validate(self, attrs):
+        if attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError({'date_to': 'Дата окончания не может быть раньше даты начала'})
+        if (attrs['date_to'] - attrs['date_from']).days >= REVENUE_REPORT_MAX_DAYS:
+            raise serializers.ValidationError(
+                {'date_to': f'Период отчёта не может превышать {REVENUE_REPORT_MAX_DAYS} дней'})
+        return attrs
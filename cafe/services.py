@@ -1,13 +1,52 @@
-from datetime import datetime
+import csv
+from collections import defaultdict, Counter
+from datetime import datetime, date, time, timedelta
+from functools import partial
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, Dict, Any, List, Tuple, Type
 
+from asgiref.sync import sync_to_async
+
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.db import transaction, IntegrityError
 from django.utils import timezone
 from django.http import QueryDict
-from django.db.models import QuerySet
+from django.utils.dateparse import parse_date
+from django.db.models import Model, QuerySet, Sum, Count, F, Q
+from django.db.models.functions import TruncDate, ExtractHour
+from rest_framework.exceptions import ValidationError
+
+from cafe.cache import invalidate_model_cache
+from cafe.events import get_order_payload, publish_order_events
+from cafe.models import Order, OrderLine, Item, DailyRevenue, HourlyTableRevenue
+from core.renderers import dumps
+from core.settings import ORDERS_EXPORT_CHUNK_SIZE, MULTI_GET_MAX
+
+
+def parse_query_date(query: QueryDict, name: str) -> date:
+    try:
+        value = parse_date(query.get(name, ''))
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({name: 'Неверный формат даты, используйте YYYY-MM-DD'})
+    return value
+
+
+def get_day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def get_day_range(day: date) -> Q:
+    return Q(created__gte=get_day_start(day), created__lt=get_day_start(day + timedelta(days=1)))
 
 
 def filter_by_table_number(queryset: QuerySet, query: QueryDict) -> QuerySet:
-    lst = query.getlist('table_number')
-    queryset = queryset.filter(table_number__in={int(table) for table in lst})
+    try:
+        tables = {int(table) for table in query.getlist('table_number')}
+    except (TypeError, ValueError):
+        raise ValidationError({'table_number': 'Номер стола должен быть целым числом'})
+    queryset = queryset.filter(table_number__in=tables)
     return queryset
 
 
@@ -18,16 +57,29 @@ def filter_by_status(queryset: QuerySet, query: QueryDict) -> QuerySet:
 
 
 def filter_by_date(queryset: QuerySet, query: QueryDict) -> QuerySet:
-    date = query.get('date')
-    queryset = queryset.filter(created__date=date)
+    queryset = queryset.filter(get_day_range(parse_query_date(query, 'date')))
+    return queryset
+
+
+def filter_by_date_from(queryset: QuerySet, query: QueryDict) -> QuerySet:
+    queryset = queryset.filter(created__gte=get_day_start(parse_query_date(query, 'date_from')))
+    return queryset
+
+
+def filter_by_date_to(queryset: QuerySet, query: QueryDict) -> QuerySet:
+    date_to = parse_query_date(query, 'date_to')
+    queryset = queryset.filter(created__lt=get_day_start(date_to + timedelta(days=1)))
     return queryset
 
 
 def filter_by_today(queryset: QuerySet, now: datetime) -> QuerySet:
-    queryset = queryset.filter(created__year=now.year, created__month=now.month, created__day=now.day)
+    queryset = queryset.filter(get_day_range(now.date()))
     return queryset
 
 
+ORDER_FILTERS = ['table_number', 'status', 'date', 'date_from', 'date_to', 'today']
+
+
 def filter_orders(queryset: QuerySet, query: QueryDict) -> QuerySet:
     if 'table_number' in query:
         queryset = filter_by_table_number(queryset, query)
@@ -35,6 +87,260 @@ def filter_orders(queryset: QuerySet, query: QueryDict) -> QuerySet:
         queryset = filter_by_status(queryset, query)
     if 'date' in query:
         queryset = filter_by_date(queryset, query)
+    if 'date_from' in query:
+        queryset = filter_by_date_from(queryset, query)
+    if 'date_to' in query:
+        queryset = filter_by_date_to(queryset, query)
     if 'today' in query:
         queryset = filter_by_today(queryset, timezone.localtime(timezone.now()))
     return queryset
+
+
+def parse_query_ids(query: QueryDict, name: str = 'ids') -> List[int]:
+    try:
+        ids = [int(value) for values in query.getlist(name) for value in values.split(',') if value.strip()]
+    except ValueError:
+        raise ValidationError({name: 'Список id должен состоять из целых чисел через запятую'})
+    if not ids:
+        raise ValidationError({name: 'Укажите хотя бы один id'})
+    if len(ids) > MULTI_GET_MAX:
+        raise ValidationError({name: f'Нельзя запросить больше {MULTI_GET_MAX} объектов за раз'})
+    return ids
+
+
+def get_multi_get_results(ids: List[int], rows: List[Dict[str, Any]],
+                          data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    found = {row['id']: item for row, item in zip(rows, data)}
+    return [found.get(pk, {'id': pk, 'detail': 'Не найдено.'}) for pk in ids]
+
+
+class Echo:
+    def write(self, value: str) -> str:
+        return value
+
+
+ORDER_EXPORT_FIELDS = ['id', 'table_number', 'status', 'total_price', 'created']
+
+
+def attach_order_items(rows: List[Dict[str, Any]], item_fields: List[str] | None = None) -> List[Dict[str, Any]]:
+    lines = OrderLine.objects.filter(order_id__in=[row['id'] for row in rows]).values('order_id').annotate(
+        item_ids=ArrayAgg('item_id', ordering='id'),
+        quantities=ArrayAgg('quantity', ordering='id'),
+    ) if rows else []
+    items = {
+        line['order_id']: [pk for pk, quantity in zip(line['item_ids'], line['quantities']) for _ in range(quantity)]
+        for line in lines
+    }
+    if item_fields:
+        expanded = {item['id']: item for item in Item.objects.filter(
+            id__in={pk for pks in items.values() for pk in pks}
+        ).values(*item_fields)}
+        items = {order_id: [expanded[pk] for pk in pks] for order_id, pks in items.items()}
+    for row in rows:
+        row['items'] = items.get(row['id'], [])
+    return rows
+
+
+def iter_orders_for_export(queryset: QuerySet, chunk_size: int = ORDERS_EXPORT_CHUNK_SIZE
+                           ) -> Iterator[Tuple[tuple, List[int]]]:
+    rows = queryset.order_by('id').values_list(*ORDER_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    while chunk := list(islice(rows, chunk_size)):
+        items = defaultdict(list)
+        lines = OrderLine.objects.filter(
+            order_id__in=[row[0] for row in chunk]
+        ).order_by('id').values_list('order_id', 'item_id', 'quantity')
+        for order_id, item_id, quantity in lines:
+            items[order_id].extend([item_id] * quantity)
+        for row in chunk:
+            yield row, items[row[0]]
+
+
+def export_orders_csv(queryset: QuerySet) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow([*ORDER_EXPORT_FIELDS, 'items'])
+    for (pk, table_number, status, total_price, created), items in iter_orders_for_export(queryset):
+        yield writer.writerow([pk, table_number, status, total_price, timezone.localtime(created).isoformat(),
+                               ' '.join(map(str, items))])
+
+
+def export_orders_ndjson(queryset: QuerySet) -> Iterator[bytes]:
+    for (pk, table_number, status, total_price, created), items in iter_orders_for_export(queryset):
+        yield dumps({'id': pk, 'table_number': table_number, 'status': status, 'total_price': total_price,
+                     'created': timezone.localtime(created).isoformat(), 'items': items}) + b'\n'
+
+
+async def iterate_in_thread(iterator: Iterator, chunk_size: int = ORDERS_EXPORT_CHUNK_SIZE) -> AsyncIterator:
+    # under ASGI a sync streaming iterator is read into a list before the first byte is sent,
+    # so the export is pulled a chunk at a time in the sync thread instead
+    next_chunk = sync_to_async(lambda: list(islice(iterator, chunk_size)))
+    while chunk := await next_chunk():
+        for value in chunk:
+            yield value
+
+
+def create_orders(orders_data: List[Dict[str, Any]]) -> List[Order]:
+    # bulk_create doesn't send signals, so the rollup, the cache and the subscribers are updated here
+    with transaction.atomic():
+        orders = Order.objects.create_many(orders_data)
+        deltas, table_deltas = defaultdict(Counter), defaultdict(Counter)
+        for order in orders:
+            deltas[timezone.localdate(order.created)].update(get_revenue_deltas(order.status, order.total_price))
+            table_deltas[get_table_revenue_key(order.created, order.table_number)].update(
+                get_table_revenue_deltas(order.status, order.total_price))
+        for day, day_deltas in deltas.items():
+            update_daily_revenue(day, day_deltas)
+        update_table_revenue(table_deltas)
+        invalidate_model_cache(Order)
+        transaction.on_commit(partial(publish_order_events, [get_order_payload(order, 'created') for order in orders]))
+    return orders
+
+
+def make_query(filters: Dict[str, Any]) -> QueryDict:
+    query = QueryDict(mutable=True)
+    for key, value in filters.items():
+        query.setlist(key, [str(v) for v in value] if isinstance(value, (list, tuple)) else [str(value)])
+    return query
+
+
+def transition_orders(queryset: QuerySet, status: str) -> List[int]:
+    sources = Order.TRANSITIONS[status]
+    with transaction.atomic():
+        rows = list(queryset.filter(status__in=sources).order_by('id').select_for_update().values_list(
+            'id', 'table_number', 'status', 'total_price', 'created'
+        ))
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        Order.objects.filter(id__in=ids).update(status=status, updated=timezone.now())
+
+        deltas, table_deltas = defaultdict(Counter), defaultdict(Counter)
+        for _, table_number, old_status, total_price, created in rows:
+            day = deltas[timezone.localdate(created)]
+            day.update(get_revenue_deltas(old_status, total_price, sign=-1))
+            day.update(get_revenue_deltas(status, total_price))
+            table = table_deltas[get_table_revenue_key(created, table_number)]
+            table.update(get_table_revenue_deltas(old_status, total_price, sign=-1))
+            table.update(get_table_revenue_deltas(status, total_price))
+        for day, day_deltas in deltas.items():
+            update_daily_revenue(day, day_deltas)
+        update_table_revenue(table_deltas)
+
+        invalidate_model_cache(Order)
+        orders = [Order(id=pk, table_number=table_number, status=status, total_price=total_price, created=created)
+                  for pk, table_number, _, total_price, created in rows]
+        transaction.on_commit(partial(publish_order_events,
+                                      [get_order_payload(order, 'status_changed') for order in orders]))
+    return ids
+
+
+def get_order_days(queryset: QuerySet) -> set:
+    return set(queryset.annotate(
+        day=TruncDate('created', tzinfo=timezone.get_current_timezone())
+    ).order_by().values_list('day', flat=True).distinct())
+
+
+def get_revenue_deltas(status: str, total_price: int, sign: int = 1) -> Dict[str, int]:
+    count_field, total_field = DailyRevenue.STATUS_FIELDS[status]
+    return {'orders_count': sign, count_field: sign, total_field: sign * total_price}
+
+
+def update_counters(model: Type[Model], lookup: Dict[str, Any], deltas: Dict[str, int]) -> None:
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    values = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**lookup).update(**values):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        model.objects.filter(**lookup).update(**values)
+
+
+def update_daily_revenue(day: date, deltas: Dict[str, int]) -> None:
+    update_counters(DailyRevenue, {'date': day}, deltas)
+
+
+def get_table_revenue_key(created: datetime, table_number: int) -> Tuple[date, int, int]:
+    created = timezone.localtime(created)
+    return created.date(), created.hour, table_number
+
+
+def get_table_revenue_deltas(status: str, total_price: int, sign: int = 1) -> Dict[str, int]:
+    # only paid orders are broken down by table and hour
+    if status != Order.Status.PAID:
+        return {}
+    return {'paid_count': sign, 'revenue': sign * total_price}
+
+
+def update_table_revenue(deltas: Dict[Tuple[date, int, int], Dict[str, int]]) -> None:
+    for (day, hour, table_number), key_deltas in deltas.items():
+        update_counters(HourlyTableRevenue, {'date': day, 'hour': hour, 'table_number': table_number}, key_deltas)
+
+
+def refresh_daily_revenue(days: Iterable[date]) -> None:
+    rows = {day: dict.fromkeys(DailyRevenue.COUNTERS, 0) for day in days}
+    if not rows:
+        return
+    days = Q()
+    for day in rows:
+        days |= get_day_range(day)
+    groups = Order.objects.filter(days).annotate(
+        day=TruncDate('created', tzinfo=timezone.get_current_timezone())
+    ).values('day', 'status').annotate(count=Count('id'), total=Sum('total_price')).order_by()
+    for group in groups:
+        row = rows[group['day']]
+        count_field, total_field = DailyRevenue.STATUS_FIELDS[group['status']]
+        row[count_field] = group['count']
+        row[total_field] = group['total']
+        row['orders_count'] += group['count']
+    for day, values in rows.items():
+        DailyRevenue.objects.update_or_create(date=day, defaults=values)
+
+    groups = Order.objects.filter(days, status=Order.Status.PAID).annotate(
+        day=TruncDate('created', tzinfo=timezone.get_current_timezone()),
+        hour=ExtractHour('created', tzinfo=timezone.get_current_timezone()),
+    ).values('day', 'hour', 'table_number').annotate(count=Count('id'), total=Sum('total_price')).order_by()
+    with transaction.atomic():
+        HourlyTableRevenue.objects.filter(date__in=list(rows)).delete()
+        HourlyTableRevenue.objects.bulk_create([
+            HourlyTableRevenue(date=group['day'], hour=group['hour'], table_number=group['table_number'],
+                               paid_count=group['count'], revenue=group['total'])
+            for group in groups
+        ])
+
+
+def get_revenue_report(date_from: date, date_to: date) -> Dict[str, Any]:
+    rollups = {row.date: row for row in DailyRevenue.objects.filter(date__range=(date_from, date_to))}
+    days = []
+    day = date_from
+    while day <= date_to:
+        row = rollups.get(day, DailyRevenue(date=day))
+        days.append({'date': day, 'revenue': row.revenue, 'orders_count': row.orders_count,
+                     'paid_count': row.paid_count})
+        day += timedelta(days=1)
+
+    # both breakdowns are read from the (date, hour, table) rollup, not from the orders
+    # buckets emptied by deletes, table moves and status changes stay in the rollup with zero counters
+    rollups = HourlyTableRevenue.objects.filter(date__range=(date_from, date_to), paid_count__gt=0).order_by()
+    tables = rollups.values('table_number').annotate(
+        revenue=Sum('revenue'), orders_count=Sum('paid_count')
+    ).order_by('table_number')
+    hours = rollups.values('hour').annotate(
+        revenue=Sum('revenue'), orders_count=Sum('paid_count')
+    ).order_by('hour')
+
+    return {
+        'date_from': date_from,
+        'date_to': date_to,
+        'revenue': sum(day['revenue'] for day in days),
+        'paid_count': sum(day['paid_count'] for day in days),
+        'days': days,
+        'tables': list(tables),
+        'hours': list(hours),
+    }
+
+
+def get_revenue(day: date) -> int:
+    return DailyRevenue.objects.filter(date=day).values_list('revenue', flat=True).first() or 0
@@ -0,0 +1,111 @@
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from functools import partial
+from typing import Dict, Tuple
+
+from django.db import transaction
+from django.db.models.signals import post_init, pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from cafe.cache import invalidate_model_cache
+from cafe.events import get_order_payload, publish_order_event
+from cafe.menu_index import record_item_changes
+from cafe.models import Order, OrderLine, Item
+from cafe.services import get_revenue_deltas, update_daily_revenue, get_table_revenue_key, \
+    get_table_revenue_deltas, update_table_revenue
+
+
+def get_revenue_state(order: Order) -> tuple:
+    # deferred fields are not loaded on purpose: they can't be changed without being set
+    return order.__dict__.get('status'), order.__dict__.get('total_price'), order.__dict__.get('table_number')
+
+
+def get_table_deltas(created: datetime, state: tuple, sign: int = 1) -> Dict[Tuple[date, int, int], Counter]:
+    status, total_price, table_number = state
+    return {get_table_revenue_key(created, table_number): Counter(get_table_revenue_deltas(status, total_price, sign))}
+
+
+@receiver(post_init, sender=Order)
+def remember_order_state(sender, instance: Order, **kwargs) -> None:
+    instance._revenue_state = get_revenue_state(instance)
+    instance._published_status = instance.__dict__.get('status')
+
+
+@receiver(pre_save, sender=Order)
+def load_order_table(sender, instance: Order, **kwargs) -> None:
+    # the table rollup needs the table the order was on, even when the field wasn't loaded
+    status, total_price, table_number = instance._revenue_state
+    if table_number is None and instance.pk is not None:
+        table_number = Order.objects.filter(pk=instance.pk).values_list('table_number', flat=True).first()
+        instance._revenue_state = status, total_price, table_number
+
+
+@receiver(post_save, sender=Order)
+def update_revenue_on_save(sender, instance: Order, created: bool, **kwargs) -> None:
+    old_state = instance._revenue_state
+    new_state = instance._revenue_state = get_revenue_state(instance)
+    if new_state[2] is None:
+        new_state = (*new_state[:2], old_state[2])
+    old_status, old_total, _ = old_state
+    new_status, new_total, _ = new_state
+    day = timezone.localdate(instance.created)
+
+    if created:
+        update_daily_revenue(day, get_revenue_deltas(new_status, new_total))
+        update_table_revenue(get_table_deltas(instance.created, new_state))
+        return
+    if None in (*old_state, *new_state) or old_state == new_state:
+        return
+
+    deltas = get_revenue_deltas(old_status, old_total, sign=-1)
+    for field, delta in get_revenue_deltas(new_status, new_total).items():
+        deltas[field] = deltas.get(field, 0) + delta
+    update_daily_revenue(day, deltas)
+
+    table_deltas = defaultdict(Counter, get_table_deltas(instance.created, old_state, sign=-1))
+    for key, key_deltas in get_table_deltas(instance.created, new_state).items():
+        table_deltas[key].update(key_deltas)
+    update_table_revenue(table_deltas)
+
+
+@receiver(post_delete, sender=Order)
+def update_revenue_on_delete(sender, instance: Order, **kwargs) -> None:
+    state = instance._revenue_state
+    if None not in state:
+        status, total_price, _ = state
+        update_daily_revenue(timezone.localdate(instance.created), get_revenue_deltas(status, total_price, sign=-1))
+        update_table_revenue(get_table_deltas(instance.created, state, sign=-1))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+@receiver(post_save, sender=OrderLine)
+@receiver(post_delete, sender=OrderLine)
+@receiver(m2m_changed, sender=Order.items.through)
+def invalidate_orders_cache(sender, **kwargs) -> None:
+    invalidate_model_cache(Order)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def invalidate_items_cache(sender, **kwargs) -> None:
+    invalidate_model_cache(Item)
+
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def record_menu_change(sender, instance: Item, **kwargs) -> None:
+    transaction.on_commit(partial(record_item_changes, [instance.pk]))
+
+
+@receiver(post_save, sender=Order)
+def publish_order_change(sender, instance: Order, created: bool, **kwargs) -> None:
+    old_status, instance._published_status = instance._published_status, instance.__dict__.get('status')
+    if created:
+        event = 'created'
+    elif old_status != instance._published_status and instance._published_status is not None:
+        event = 'status_changed'
+    else:
+        return
+    transaction.on_commit(partial(publish_order_event, get_order_payload(instance, event)))
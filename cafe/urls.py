@@ -1,14 +1,19 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from cafe.views import OrdersViewSet, ItemsViewSet, CalcRevenueView, SearchItemView
+from cafe.views import OrdersViewSet, ItemsViewSet, CalcRevenueView, RevenueReportView, SearchItemView, \
+    SearchItemsView, AutocompleteItemsView, order_events
 
 router = routers.SimpleRouter()
 router.register("orders", OrdersViewSet)
 router.register("items", ItemsViewSet)
 
 urlpatterns = [
+    path("orders/events/", order_events, name='order-events'),
     path("", include(router.urls)),
     path("revenue/", CalcRevenueView.as_view(), name='calc_revenue'),
+    path("revenue/report/", RevenueReportView.as_view(), name='revenue_report'),
     path("search/", SearchItemView.as_view(), name='item-search'),
+    path("search/items/", SearchItemsView.as_view(), name='items-search'),
+    path("search/autocomplete/", AutocompleteItemsView.as_view(), name='items-autocomplete'),
 ]
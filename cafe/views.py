@@ -1,16 +1,36 @@
 from typing import Any
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse, HttpRequest, HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
 from rest_framework import mixins, viewsets
-from rest_framework.status import HTTP_200_OK, HTTP_400_BAD_REQUEST
+from rest_framework.decorators import action
+from rest_framework.status import HTTP_200_OK, HTTP_201_CREATED, HTTP_207_MULTI_STATUS, HTTP_400_BAD_REQUEST, \
+    HTTP_401_UNAUTHORIZED
 from rest_framework.response import Response
-from rest_framework.generics import CreateAPIView, RetrieveAPIView, get_object_or_404
+from rest_framework.generics import CreateAPIView, GenericAPIView, RetrieveAPIView, get_object_or_404
 from rest_framework.permissions import IsAdminUser
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.utils.urls import replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes
 
-from cafe.documents import ItemDocument
-from cafe.models import Order, Item
-from cafe.serializers import OrderSerializer, ItemSerializer, CalcRevenueSerializer
-from cafe.services import filter_orders
+from cafe.cache import cache_response, list_condition, detail_condition
+from cafe.events import stream_order_events
+from cafe.pagination import OrderKeysetPagination
+from cafe.search import SEARCH_MAX_WINDOW, search_items, hydrate_items, encode_search_after, autocomplete_items
+from cafe.models import Order, OrderLine, Item
+from cafe.serializers import OrderSerializer, ItemSerializer, CalcRevenueSerializer, RevenueReportSerializer, \
+    OrderBulkCreateSerializer, OrderTransitionSerializer, OrderItemsField, ItemSearchSerializer, \
+    ItemSearchQuerySerializer, ItemAutocompleteSerializer, ItemAutocompleteQuerySerializer
+from cafe.services import filter_orders, get_revenue_report, export_orders_csv, export_orders_ndjson, create_orders, \
+    make_query, transition_orders, attach_order_items, parse_query_ids, get_multi_get_results, iterate_in_thread
+from core.serializers import ValuesSerializer, get_requested_fields
+from core.settings import ORDERS_BULK_MAX
+from core.views import SparseFieldsViewMixin
 from users.permissions import IsActive
 
 
@@ -30,10 +50,45 @@ from users.permissions import IsActive
                              description='A date for filtering',
                              location=OpenApiParameter.QUERY
                              ),
+            OpenApiParameter(name='date_from', required=False, type=OpenApiTypes.DATE,
+                             description='Returns orders created on this date or later',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='date_to', required=False, type=OpenApiTypes.DATE,
+                             description='Returns orders created on this date or earlier',
+                             location=OpenApiParameter.QUERY
+                             ),
             OpenApiParameter(name='today', required=False, type=Any,
                              description='If today in query, returns list of today orders',
                              location=OpenApiParameter.QUERY
                              ),
+            OpenApiParameter(name='cursor', required=False, type=str,
+                             description='If cursor in query, switches to keyset pagination. '
+                                         'Pass it empty for the first page, then follow the next link',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='page_size', required=False, type=int,
+                             description='Page size for keyset pagination',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='count', required=False, type=bool,
+                             description='Set to false to skip the total count in keyset pagination',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='expand', required=False, type=str, enum=['items'],
+                             description='Set to items to get id, name and price of every item instead of its id',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='fields', required=False, type=str,
+                             description='Comma separated fields to return, e.g. id,status,total_price',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='ids', required=False, type=str,
+                             description='Comma separated ids to get in one request instead of a page. '
+                                         'Results keep the requested order, missing ids are returned as '
+                                         '{"id": <id>, "detail": "Не найдено."}',
+                             location=OpenApiParameter.QUERY
+                             ),
         ],
         responses=OrderSerializer,
         methods=["GET"],
@@ -44,7 +99,15 @@ from users.permissions import IsActive
         parameters=[
             OpenApiParameter(name='id', required=True, type=int,
                              description='A unique integer value identifying this order',
-                             location=OpenApiParameter.PATH)
+                             location=OpenApiParameter.PATH),
+            OpenApiParameter(name='expand', required=False, type=str, enum=['items'],
+                             description='Set to items to get id, name and price of every item instead of its id',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='fields', required=False, type=str,
+                             description='Comma separated fields to return, e.g. id,status,total_price',
+                             location=OpenApiParameter.QUERY
+                             )
         ],
         responses=OrderSerializer,
         methods=["GET"],
@@ -80,29 +143,185 @@ from users.permissions import IsActive
         description="Endpoint to partial change some order info"
     )
 )
-class OrdersViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.CreateModelMixin, mixins.DestroyModelMixin,
-                    mixins.UpdateModelMixin, viewsets.GenericViewSet):
+class OrdersViewSet(SparseFieldsViewMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.CreateModelMixin,
+                    mixins.DestroyModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet):
     serializer_class = OrderSerializer
-    queryset = Order.objects.prefetch_related('items').filter().order_by('-created')
+    queryset = Order.objects.filter().order_by('-created')
     permission_classes = [IsAdminUser, IsActive]
+    keyset_pagination_class = OrderKeysetPagination
+
+    @property
+    def expand_items(self) -> bool:
+        return 'items' in ','.join(self.request.query_params.getlist('expand')).split(',')
+
+    def get_queryset(self):
+        lines = OrderLine.objects.only('id', 'order_id', 'item_id', 'quantity')
+        if self.expand_items:
+            lines = lines.select_related('item').only(
+                'id', 'order_id', 'item_id', 'quantity', *[f'item__{field}' for field in OrderItemsField.expand_fields]
+            )
+        queryset = super().get_queryset()
+        requested = get_requested_fields(self.request)
+        if requested is not None and 'items' not in requested:
+            return queryset
+        return queryset.prefetch_related(Prefetch('lines', queryset=lines))
+
+    def get_serializer_context(self):
+        return {**super().get_serializer_context(), 'expand_items': self.expand_items}
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.keyset_pagination_class.cursor_query_param in self.request.query_params:
+                self._paginator = self.keyset_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def retrieve(self, request, *args, **kwargs):
+        if self.expand_items:
+            # item names and prices are not covered by the order's ETag and Last-Modified
+            return super().retrieve(request, *args, **kwargs)
+        return self.retrieve_conditional(request, *args, **kwargs)
+
+    @detail_condition(Order)
+    def retrieve_conditional(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
+    @list_condition(Order, Item)
+    @cache_response(Order, Item)
     def list(self, request, *args, **kwargs):
         query = request.query_params
-        queryset = filter_orders(self.get_queryset(), query)
+        serializer = ValuesSerializer(self.get_serializer_class(), self.get_serializer_context())
+        # id and created are needed for items and for keyset pagination even when they are not rendered
+        queryset = filter_orders(Order.objects.order_by('-created'), query).values(
+            *serializer.get_columns('id', 'created')
+        )
+        item_fields = OrderItemsField.expand_fields if self.expand_items else None
 
-        page = self.paginate_queryset(queryset)
+        ids = parse_query_ids(query) if 'ids' in query else None
+        page = self.paginate_queryset(queryset) if ids is None else None
+        rows = page if page is not None else list(queryset if ids is None else queryset.filter(id__in=ids))
+        if 'items' in serializer.serializer.fields:
+            attach_order_items(rows, item_fields)
+
+        if ids is not None:
+            return Response({'results': get_multi_get_results(ids, rows, serializer.to_representation(rows))})
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+            return self.get_paginated_response(serializer.to_representation(rows))
+        return Response(serializer.to_representation(rows))
+
+    @extend_schema(
+        request=None,
+        parameters=[
+            OpenApiParameter(name='output', required=False, type=str, enum=['csv', 'ndjson'],
+                             description='Export format, csv by default',
+                             location=OpenApiParameter.QUERY
+                             ),
+        ],
+        responses={(200, 'text/csv'): OpenApiTypes.STR, (200, 'application/x-ndjson'): OpenApiTypes.STR},
+        methods=["GET"],
+        description="Endpoint to stream export of orders. Accepts the same filters as the list of orders"
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request, *args, **kwargs):
+        queryset = filter_orders(Order.objects.all(), request.query_params)
+        output = request.query_params.get('output', 'csv')
+        if output == 'ndjson':
+            content, content_type = export_orders_ndjson(queryset), 'application/x-ndjson'
+        elif output == 'csv':
+            content, content_type = export_orders_csv(queryset), 'text/csv; charset=utf-8'
+        else:
+            return Response({'output': 'Поддерживаются форматы csv и ndjson'}, status=HTTP_400_BAD_REQUEST)
+        if isinstance(request._request, ASGIRequest):
+            content = iterate_in_thread(content)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{output}"'
+        return response
+
+    @extend_schema(
+        request=OrderBulkCreateSerializer(many=True),
+        parameters=None,
+        responses={201: OpenApiTypes.OBJECT, 207: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+        methods=["POST"],
+        description="Endpoint to create a batch of orders. Results and errors are returned in input order"
+    )
+    @action(detail=False, methods=['post'])
+    def bulk(self, request, *args, **kwargs):
+        if not isinstance(request.data, list) or not request.data:
+            return Response({'detail': 'Ожидался непустой список заказов'}, status=HTTP_400_BAD_REQUEST)
+        if len(request.data) > ORDERS_BULK_MAX:
+            return Response({'detail': f'Нельзя создать больше {ORDERS_BULK_MAX} заказов за раз'},
+                            status=HTTP_400_BAD_REQUEST)
+
+        results = [None] * len(request.data)
+        valid = []
+        for index, data in enumerate(request.data):
+            serializer = OrderBulkCreateSerializer(data=data)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'errors': serializer.errors}
+
+        items_field = OrderItemsField()
+        items = items_field.get_objects(pk for _, data in valid for pk in data['items'])
+        to_create = []
+        for index, data in valid:
+            try:
+                to_create.append((index, {**data, 'items': items_field.resolve(data['items'], items)}))
+            except ValidationError as exc:
+                results[index] = {'index': index, 'errors': {'items': exc.detail}}
+
+        orders = create_orders([data for _, data in to_create]) if to_create else []
+        for (index, _), order in zip(to_create, orders):
+            results[index] = {'index': index, 'id': order.id, 'total_price': order.total_price}
+
+        if len(orders) == len(results):
+            response_status = HTTP_201_CREATED
+        elif orders:
+            response_status = HTTP_207_MULTI_STATUS
+        else:
+            response_status = HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=response_status)
+
+    @extend_schema(
+        request=OrderTransitionSerializer,
+        parameters=None,
+        responses={200: OpenApiTypes.OBJECT},
+        methods=["POST"],
+        description="Endpoint to move orders selected by ids and/or by list filters to the next status "
+                    "(WAIT -> READY -> PAID). Orders in other statuses are left untouched"
+    )
+    @action(detail=False, methods=['post'])
+    def transition(self, request, *args, **kwargs):
+        serializer = OrderTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = Order.objects.all()
+        if 'filter' in serializer.validated_data:
+            queryset = filter_orders(queryset, make_query(serializer.validated_data['filter']))
+        if 'ids' in serializer.validated_data:
+            queryset = queryset.filter(id__in=serializer.validated_data['ids'])
+
+        ids = transition_orders(queryset, serializer.validated_data['status'])
+        return Response({'count': len(ids), 'ids': ids}, status=HTTP_200_OK)
 
 
 @extend_schema_view(
     list=extend_schema(
         request=None,
-        parameters=None,
+        parameters=[
+            OpenApiParameter(name='fields', required=False, type=str,
+                             description='Comma separated fields to return, e.g. id,name,price',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='ids', required=False, type=str,
+                             description='Comma separated ids to get in one request instead of a page. '
+                                         'Results keep the requested order, missing ids are returned as '
+                                         '{"id": <id>, "detail": "Не найдено."}',
+                             location=OpenApiParameter.QUERY
+                             ),
+        ],
         responses=ItemSerializer,
         methods=["GET"],
         description="Endpoint to get list of all items"
@@ -112,7 +331,11 @@ class OrdersViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.Cre
         parameters=[
             OpenApiParameter(name='id', required=True, type=int,
                              description='A unique integer value identifying this item',
-                             location=OpenApiParameter.PATH)
+                             location=OpenApiParameter.PATH),
+            OpenApiParameter(name='fields', required=False, type=str,
+                             description='Comma separated fields to return, e.g. id,name,price',
+                             location=OpenApiParameter.QUERY
+                             )
         ],
         responses=ItemSerializer,
         methods=["GET"],
@@ -148,12 +371,33 @@ class OrdersViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.Cre
         description="Endpoint to partial change some item info"
     )
 )
-class ItemsViewSet(mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.CreateModelMixin, mixins.DestroyModelMixin,
-                   mixins.UpdateModelMixin, viewsets.GenericViewSet):
+class ItemsViewSet(SparseFieldsViewMixin, mixins.RetrieveModelMixin, mixins.ListModelMixin, mixins.CreateModelMixin,
+                   mixins.DestroyModelMixin, mixins.UpdateModelMixin, viewsets.GenericViewSet):
     serializer_class = ItemSerializer
     queryset = Item.objects.filter().order_by('id')
     permission_classes = [IsAdminUser, IsActive]
 
+    @list_condition(Item)
+    @cache_response(Item)
+    def list(self, request, *args, **kwargs):
+        serializer = ValuesSerializer(self.get_serializer_class(), self.get_serializer_context())
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.get_columns('id'))
+
+        if 'ids' in request.query_params:
+            ids = parse_query_ids(request.query_params)
+            rows = list(queryset.filter(id__in=ids))
+            return Response({'results': get_multi_get_results(ids, rows, serializer.to_representation(rows))})
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+
+        return Response(serializer.to_representation(queryset))
+
+    @detail_condition(Item)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
 
 @extend_schema_view(
     create=extend_schema(
@@ -175,6 +419,34 @@ class CalcRevenueView(CreateAPIView):
         return Response({'revenue': revenue}, status=HTTP_200_OK)
 
 
+@extend_schema_view(
+    retrieve=extend_schema(
+        request=None,
+        parameters=[
+            OpenApiParameter(name='date_from', required=True, type=OpenApiTypes.DATE,
+                             description='First day of the report',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='date_to', required=True, type=OpenApiTypes.DATE,
+                             description='Last day of the report (inclusive)',
+                             location=OpenApiParameter.QUERY
+                             ),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+        methods=["GET"],
+        description="Endpoint to get revenue for a range of dates grouped per day, per table and per hour"
+    )
+)
+class RevenueReportView(RetrieveAPIView):
+    serializer_class = RevenueReportSerializer
+    permission_classes = [IsAdminUser, IsActive]
+
+    def retrieve(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(get_revenue_report(**serializer.validated_data), status=HTTP_200_OK)
+
+
 @extend_schema_view(
     retrieve=extend_schema(
         request=None,
@@ -194,12 +466,121 @@ class SearchItemView(RetrieveAPIView):
     permission_classes = [IsAdminUser, IsActive]
 
     def retrieve(self, request, *args, **kwargs):
-        search_results = ItemDocument.search().query(
-            "multi_match",
-            query=request.query_params.get('match'),
-            fields=["name", "description"]
-        ).execute()
-        if search_results:
-            serializer = self.get_serializer(get_object_or_404(Item, pk=search_results[0].meta['id']))
+        _, rows, _ = search_items(request.query_params.get('match', ''), 1)
+        if rows:
+            serializer = self.get_serializer(get_object_or_404(Item, pk=rows[0]['id']))
             return Response(serializer.data)
         return Response({'detail': "Объектов не обнаружено"}, status=HTTP_400_BAD_REQUEST)
+
+
+@extend_schema_view(
+    get=extend_schema(
+        request=None,
+        parameters=[
+            OpenApiParameter(name='match', required=True, type=str,
+                             description='A match phrase',
+                             location=OpenApiParameter.QUERY, explode=False
+                             ),
+            OpenApiParameter(name='size', required=False, type=int,
+                             description='Hits per page, up to 100',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='from', required=False, type=int,
+                             description='Offset of the first hit, from + size must not exceed 10000',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='search_after', required=False, type=str,
+                             description='If search_after in query, pages are fetched after the last hit. '
+                                         'Pass it empty for the first page, then follow the next link',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='fields', required=False, type=str,
+                             description='Comma separated fields to return. Fields that are not indexed '
+                                         '(updated) are read from the database',
+                             location=OpenApiParameter.QUERY
+                             ),
+        ],
+        responses=ItemSearchSerializer(many=True),
+        description="Endpoint to elastic search items, ranked by relevance"
+    )
+)
+class SearchItemsView(GenericAPIView):
+    serializer_class = ItemSearchSerializer
+    permission_classes = [IsAdminUser, IsActive]
+
+    def get(self, request, *args, **kwargs):
+        params = ItemSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        serializer = ValuesSerializer(self.get_serializer_class(), self.get_serializer_context())
+
+        total, rows, last_sort = search_items(query['match'], query['size'], query['from'], query.get('search_after'))
+        has_next = len(rows) == query['size']
+        rows = hydrate_items(rows, serializer.get_columns())
+
+        next_link = None
+        if 'search_after' in query and has_next:
+            next_link = replace_query_param(request.build_absolute_uri(), 'search_after',
+                                            encode_search_after(last_sort))
+        elif 'search_after' not in query and query['from'] + query['size'] < min(total, SEARCH_MAX_WINDOW):
+            next_link = replace_query_param(request.build_absolute_uri(), 'from', query['from'] + query['size'])
+
+        return Response({'count': total, 'next': next_link, 'results': serializer.to_representation(rows)})
+
+
+@extend_schema_view(
+    get=extend_schema(
+        request=None,
+        parameters=[
+            OpenApiParameter(name='prefix', required=True, type=str,
+                             description='What has been typed so far, every word is matched as a prefix',
+                             location=OpenApiParameter.QUERY
+                             ),
+            OpenApiParameter(name='size', required=False, type=int,
+                             description='Suggestions to return, up to 20',
+                             location=OpenApiParameter.QUERY
+                             ),
+        ],
+        responses=ItemAutocompleteSerializer(many=True),
+        description="Endpoint to suggest items by the beginning of their name"
+    )
+)
+class AutocompleteItemsView(GenericAPIView):
+    serializer_class = ItemAutocompleteSerializer
+    permission_classes = [IsAdminUser, IsActive]
+
+    def get(self, request, *args, **kwargs):
+        params = ItemAutocompleteQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        # rows from the index already have the response shape, they are returned as they are
+        return Response(autocomplete_items(params.validated_data['prefix'], params.validated_data['size']))
+
+
+def is_active_admin(request: HttpRequest) -> bool:
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken):
+        return False
+    if authenticated is None:
+        return False
+    user = authenticated[0]
+    return user.is_staff and user.is_active and user.email_address.verified
+
+
+@require_GET
+async def order_events(request: HttpRequest) -> HttpResponse:
+    if not await sync_to_async(is_active_admin)(request):
+        return JsonResponse({'detail': 'Учетные данные не были предоставлены.'}, status=HTTP_401_UNAUTHORIZED)
+    try:
+        tables = {int(table) for table in request.GET.getlist('table_number')}
+    except ValueError:
+        return JsonResponse({'table_number': 'Номер стола должен быть числом'}, status=HTTP_400_BAD_REQUEST)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    response = StreamingHttpResponse(
+        stream_order_events(last_event_id, set(request.GET.getlist('status')), tables),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
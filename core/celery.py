@@ -13,3 +13,17 @@ app = Celery(
 )
 
 app.autodiscover_tasks()
+
+
+@app.task(bind=True, max_retries=settings.SEARCH_INDEX_MAX_RETRIES, ignore_result=True)
+def flush_search_index(self) -> None:
+    from elasticsearch import ApiError, TransportError
+    from elasticsearch.helpers import BulkIndexError
+
+    from core.indexing import flush_index_queue
+
+    try:
+        flush_index_queue()
+    except (ApiError, TransportError, BulkIndexError) as exc:
+        # ids are back in the queue, exponential backoff before the next try
+        raise self.retry(exc=exc, countdown=settings.SEARCH_INDEX_RETRY_BACKOFF * 2 ** self.request.retries)
@@ -0,0 +1,104 @@
+import logging
+from functools import partial
+from typing import Iterable, List, Type
+
+import redis
+from django.db import models, transaction
+from django_elasticsearch_dsl.registries import registry
+from django_elasticsearch_dsl.signals import BaseSignalProcessor
+from kombu.exceptions import OperationalError
+
+from core.redis import get_redis
+from core.settings import SEARCH_INDEX_FLUSH_DELAY, SEARCH_INDEX_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+FLUSH_SCHEDULED_KEY = 'search_index:flush_scheduled'
+
+
+def get_queue_key(model: Type[models.Model]) -> str:
+    return f'search_index:queue:{model._meta.label_lower}'
+
+
+def get_search_version_key(model: Type[models.Model]) -> str:
+    return f'search_index:version:{model._meta.label_lower}'
+
+
+def get_search_version(model: Type[models.Model]) -> int:
+    return int(get_redis().get(get_search_version_key(model)) or 0)
+
+
+def bump_search_version(model: Type[models.Model]) -> None:
+    # cached search results are keyed by it, so they are dropped once the index has the change
+    get_redis().incr(get_search_version_key(model))
+
+
+def schedule_flush() -> None:
+    from core.celery import flush_search_index
+
+    # one flush per delay window, however many objects change in it
+    if get_redis().set(FLUSH_SCHEDULED_KEY, 1, nx=True, ex=SEARCH_INDEX_FLUSH_DELAY + 60):
+        flush_search_index.apply_async(countdown=SEARCH_INDEX_FLUSH_DELAY)
+
+
+def enqueue(model: Type[models.Model], pks: Iterable) -> None:
+    try:
+        # a set, so repeated edits of one object are indexed once
+        get_redis().sadd(get_queue_key(model), *pks)
+        schedule_flush()
+    except (redis.RedisError, OperationalError):
+        logger.exception('Failed to queue %s %s for indexing', model._meta.label, list(pks))
+
+
+def index_objects(model: Type[models.Model], pks: List) -> None:
+    pks = [model._meta.pk.to_python(pk) for pk in pks]
+    for document_class in registry.get_documents([model]):
+        document = document_class()
+        objects = document.get_queryset().filter(pk__in=pks)
+        actions = list(document.get_actions(objects, 'index'))
+        indexed = {str(action['_id']) for action in actions}
+        # whatever is gone from the database (or shouldn't be indexed any more) is removed
+        actions += [{'_op_type': 'delete', '_index': document._index._name, '_id': pk}
+                    for pk in pks if str(pk) not in indexed]
+        # refreshed, so searches see the change as soon as the version is bumped
+        document.bulk(actions, ignore_status=(404,), refresh=True)
+    bump_search_version(model)
+
+
+def flush_index_queue(batch_size: int = SEARCH_INDEX_BATCH_SIZE) -> int:
+    connection = get_redis()
+    connection.delete(FLUSH_SCHEDULED_KEY)
+    flushed = 0
+    for model in registry.get_models():
+        key = get_queue_key(model)
+        while pks := connection.spop(key, batch_size):
+            try:
+                index_objects(model, pks)
+            except Exception:
+                connection.sadd(key, *pks)
+                raise
+            flushed += len(pks)
+    return flushed
+
+
+class QueuedSignalProcessor(BaseSignalProcessor):
+    """
+    Records ids of changed objects in Redis once the transaction commits;
+    flush_search_index indexes them in bulk batches, outside of the request.
+    """
+
+    def setup(self):
+        models.signals.post_save.connect(self.handle_save)
+        models.signals.post_delete.connect(self.handle_delete)
+
+    def teardown(self):
+        models.signals.post_save.disconnect(self.handle_save)
+        models.signals.post_delete.disconnect(self.handle_delete)
+
+    def handle_save(self, sender, instance, **kwargs):
+        if sender in registry.get_models():
+            transaction.on_commit(partial(enqueue, sender, [instance.pk]))
+
+    def handle_delete(self, sender, instance, **kwargs):
+        if sender in registry.get_models():
+            transaction.on_commit(partial(enqueue, sender, [instance.pk]))
@@ -0,0 +1,23 @@
+import codecs
+from typing import Any, IO
+
+from django.conf import settings
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+from core.renderers import orjson
+
+
+class JSONParser(parsers.JSONParser):
+    """
+    JSONParser on top of orjson, when it is installed. Non UTF-8 bodies go through the stdlib parser.
+    """
+
+    def parse(self, stream: IO[bytes], media_type: str | None = None, parser_context: dict | None = None) -> Any:
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or codecs.lookup(encoding).name != 'utf-8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,16 @@
+from functools import lru_cache
+
+import redis
+import redis.asyncio
+
+from core.settings import REDIS_URL
+
+
+@lru_cache(maxsize=None)
+def get_redis() -> redis.Redis:
+    return redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    # asyncio connections are bound to the event loop, so they are not shared between requests
+    return redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
@@ -0,0 +1,70 @@
+from math import isfinite
+from typing import Any
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+# datetimes, Decimals, lazy strings, querysets etc. are encoded exactly as DRF does it
+_encoder = encoders.JSONEncoder()
+_SCALARS = frozenset([str, int, bool, type(None)])
+
+
+def has_non_finite(value: Any) -> bool:
+    if isinstance(value, float):
+        return not isfinite(value)
+    if isinstance(value, dict):
+        value = value.values()
+    elif not isinstance(value, (list, tuple)):
+        return False
+    # rows of plain values, the most common case, are checked without a call per value
+    if _SCALARS.issuperset(map(type, value)):
+        return False
+    return any(map(has_non_finite, value))
+
+
+def may_have_non_finite(data: Any, rendered: bytes) -> bool:
+    # every None and every non-finite float is a null in the output, so nulls that are all accounted
+    # for by the None values at the top, e.g. the pagination links, leave no room for a NaN
+    nones = sum(value is None for value in data.values()) if isinstance(data, dict) else 0
+    return rendered.count(b'null') > nones
+
+
+def dumps(data: Any) -> bytes:
+    if orjson is None:
+        return renderers.JSONRenderer().render(data)
+    ret = orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+    # orjson writes NaN and infinities as null, the strict DRF renderer refuses them
+    if may_have_non_finite(data, ret) and has_non_finite(data):
+        raise ValueError('Out of range float values are not JSON compliant')
+    # same escaping as DRF: these are valid JSON but break javascript string literals
+    if b'\xe2\x80' in ret:
+        ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return ret
+
+
+class JSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer on top of orjson, when it is installed.
+
+    Indented output, non-default encoder settings, non-strict mode and values orjson
+    can't encode (e.g. integers over 64 bits) are rendered by the stdlib json renderer.
+    """
+
+    def render(self, data: Any, accepted_media_type: str | None = None, renderer_context: dict | None = None) -> bytes:
+        if data is None:
+            return b''
+        if (orjson is None or not self.compact or not self.strict or self.ensure_ascii
+                or self.encoder_class is not encoders.JSONEncoder
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            return dumps(data)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,144 @@
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple, Type
+
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.urls import reverse, get_script_prefix, get_urlconf
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+
+FIELDS_QUERY_PARAM = 'fields'
+
+
+class HyperlinkedIdentityField(serializers.HyperlinkedIdentityField):
+    """
+    Resolves the route once per process and builds every other url with string concatenation.
+
+    Output is the same as reverse() + request.build_absolute_uri(); format suffixes,
+    versioned requests and non-integer lookups still go through reverse().
+    """
+    LOOKUP_SENTINEL = 7306029481
+
+    _templates: Dict[tuple, Tuple[str, str] | None] = {}
+    _request_prefix: Tuple[Any, str, str] = (None, '', '')
+
+    def get_url(self, obj: Any, view_name: str, request: Request, format: str | None) -> str | None:
+        lookup_value = getattr(obj, self.lookup_field, None)
+        if format or type(lookup_value) is not int or getattr(request, 'versioning_scheme', None) is not None:
+            return super().get_url(obj, view_name, request, format)
+
+        template = self.get_template(view_name, request)
+        if template is None:
+            return super().get_url(obj, view_name, request, format)
+        if request is None:
+            return f'{template[0]}{lookup_value}{template[1]}'
+        # a list is rendered by one field instance, so the host part is built once per response
+        if self._request_prefix[0] is not request or self._request_prefix[1] is not template[0]:
+            self._request_prefix = (request, template[0], request.build_absolute_uri(template[0]))
+        return f'{self._request_prefix[2]}{lookup_value}{template[1]}'
+
+    def get_template(self, view_name: str, request: Request) -> Tuple[str, str] | None:
+        urlconf = getattr(request, 'urlconf', None) or get_urlconf() or settings.ROOT_URLCONF
+        key = (view_name, self.lookup_url_kwarg, urlconf, get_script_prefix())
+        if key not in self._templates:
+            path = reverse(view_name, kwargs={self.lookup_url_kwarg: self.LOOKUP_SENTINEL}, urlconf=urlconf)
+            parts = path.split(str(self.LOOKUP_SENTINEL))
+            self._templates[key] = (parts[0], parts[1]) if len(parts) == 2 else None
+        return self._templates[key]
+
+
+def get_requested_fields(request: Request | None) -> Set[str] | None:
+    if request is None or request.method != 'GET':
+        return None
+    value = request.query_params.get(FIELDS_QUERY_PARAM)
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """
+    Limits the output of a GET request to the fields listed in `?fields=id,name`.
+
+    Fields missing from `Meta.default_fields`, when it is set, are only returned when listed.
+    """
+
+    def get_fields(self) -> Dict[str, serializers.Field]:
+        fields = super().get_fields()
+        if not (self.parent is None or isinstance(self.parent, serializers.ListSerializer)):
+            return fields
+        requested = get_requested_fields(self.context.get('request'))
+        if requested is None:
+            requested = getattr(self.Meta, 'default_fields', None)
+            if requested is None:
+                return fields
+        unknown = requested - fields.keys()
+        if unknown:
+            raise ValidationError({FIELDS_QUERY_PARAM: [f'Неизвестные поля: {", ".join(sorted(unknown))}']})
+        return {name: field for name, field in fields.items() if name in requested}
+
+
+class ValuesRow:
+    __slots__ = ('pk',)
+
+    def __init__(self, pk: Any):
+        self.pk = pk
+
+
+class ValuesSerializer:
+    """
+    Read-only rendering of a model serializer from `.values()` rows.
+
+    The plan (which column feeds which field) is compiled once per serializer class and field set;
+    per row only the fields' to_representation() run, so the output matches serializer.data.
+    Fields whose source is not a model column are read from the row by field name
+    and must be filled in by the caller.
+    """
+    _plans: Dict[tuple, List[Tuple[str, str, Any]]] = {}
+
+    def __init__(self, serializer_class: Type[serializers.ModelSerializer], context: Dict[str, Any]):
+        self.serializer = serializer_class(context=context)
+        self.plan = self.get_plan(serializer_class, self.serializer)
+
+    @classmethod
+    def get_plan(cls, serializer_class: type, serializer: serializers.ModelSerializer) -> List[Tuple[str, str, Any]]:
+        key = (serializer_class, tuple(serializer.fields))
+        if key not in cls._plans:
+            opts = serializer.Meta.model._meta
+            columns = {field.name: field for field in opts.concrete_fields}
+            plan = []
+            for field in serializer._readable_fields:
+                if isinstance(field, serializers.HyperlinkedIdentityField) and field.lookup_field == 'pk':
+                    plan.append((field.field_name, 'url', opts.pk.attname))
+                elif field.source in columns and isinstance(field, serializers.FileField):
+                    plan.append((field.field_name, 'file', columns[field.source]))
+                elif field.source in columns:
+                    plan.append((field.field_name, 'column', columns[field.source].attname))
+                else:
+                    plan.append((field.field_name, 'extra', field.field_name))
+            cls._plans[key] = plan
+        return cls._plans[key]
+
+    def get_columns(self, *required: str) -> List[str]:
+        columns = [key if kind != 'file' else key.attname for _, kind, key in self.plan if kind != 'extra']
+        return list(dict.fromkeys([*columns, *required]))
+
+    def get_getter(self, kind: str, key: Any) -> Callable[[Dict[str, Any]], Any]:
+        if kind == 'url':
+            return lambda row: ValuesRow(row[key])
+        if kind == 'file':
+            return lambda row: FieldFile(None, key, row[key.attname])
+        return itemgetter(key)
+
+    def to_representation(self, rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        fields = self.serializer.fields
+        steps = [(name, self.get_getter(kind, key), fields[name].to_representation) for name, kind, key in self.plan]
+        data = []
+        for row in rows:
+            item = {}
+            for name, getter, to_representation in steps:
+                value = getter(row)
+                item[name] = None if value is None else to_representation(value)
+            data.append(item)
+        return data
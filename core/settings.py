@@ -79,11 +79,24 @@ CACHES = {
     }
 }
 
+REDIS_URL = config("REDIS_URL", default="redis://127.0.0.1:6379/3")
+
 ELASTICSEARCH_DSL = {
     'default': {
         'hosts': config('ELASTICSEARCH_HOSTS', default='http://127.0.0.1:9200/')
     }
 }
+ELASTICSEARCH_DSL_SIGNAL_PROCESSOR = 'core.indexing.QueuedSignalProcessor'
+SEARCH_INDEX_FLUSH_DELAY = 2  # seconds
+SEARCH_INDEX_BATCH_SIZE = 500
+SEARCH_INDEX_MAX_RETRIES = 5
+SEARCH_INDEX_RETRY_BACKOFF = 5  # seconds, doubled on every retry
+AUTOCOMPLETE_CACHE_TIMEOUT = 60  # seconds
+# catalogs up to this size are searched in process, bigger ones fall back to it when elasticsearch fails
+MENU_INDEX_MAX_ITEMS = 2000
+MENU_INDEX_CHANGELOG_SIZE = 1000
+MENU_INDEX_COUNT_TIMEOUT = 300  # seconds, the item count is also dropped on every item change
+MENU_SEARCH_ES_TIMEOUT = 0.5  # seconds
 
 LOGGING = {
     'version': 1,
@@ -134,6 +147,13 @@ AUTH_PASSWORD_VALIDATORS = [
 EMAIL_CONFIRM_TIME = timedelta(minutes=30)
 EMAIL_CONFIRM_TOKEN_LENGTH = 25  # length must be less or equal than 64 !
 
+REVENUE_REPORT_MAX_DAYS = 366
+ORDERS_EXPORT_CHUNK_SIZE = 2000
+ORDERS_BULK_MAX = 500
+MULTI_GET_MAX = 100
+ORDER_EVENTS_MAXLEN = 10000  # events kept in redis for Last-Event-ID resuming
+ORDER_EVENTS_KEEPALIVE = 15  # seconds
+
 LANGUAGE_CODE = 'ru'
 USE_I18N = True
 TIME_ZONE = 'Europe/Moscow'
@@ -160,6 +180,15 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'core.parsers.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 ACCESS_TOKEN_LIFETIME = 15  # minutes
@@ -212,6 +241,10 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'Backend for cafe order management',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
+    'ENUM_NAME_OVERRIDES': {
+        'OrderStatusEnum': 'cafe.models.Order.Status',
+        'TransitionStatusEnum': 'cafe.serializers.TRANSITION_STATUS_CHOICES',
+    },
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
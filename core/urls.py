@@ -1,6 +1,7 @@
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
 urlpatterns = [
@@ -11,6 +12,8 @@ urlpatterns = [
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# uvicorn doesn't serve static files the way runserver did, in DEBUG they are served by Django
+urlpatterns += staticfiles_urlpatterns()
 
 if settings.DEBUG:
     from debug_toolbar.toolbar import debug_toolbar_urls
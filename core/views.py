@@ -0,0 +1,16 @@
+from django.db.models import QuerySet
+
+from core.serializers import ValuesSerializer, get_requested_fields
+
+
+class SparseFieldsViewMixin:
+    """
+    Reads only the columns of the fields requested with `?fields=` from the database.
+    """
+
+    def get_queryset(self) -> QuerySet:
+        queryset = super().get_queryset()
+        if get_requested_fields(self.request) is None:
+            return queryset
+        serializer = ValuesSerializer(self.get_serializer_class(), self.get_serializer_context())
+        return queryset.only(*serializer.get_columns(queryset.model._meta.pk.attname))
@@ -1,7 +1,11 @@
 #!/bin/bash
-curl -X PUT "http://localhost:9200/main_index" -H 'Content-Type: application/json' -d '{
+# the first index goes behind the main_index alias, manage.py search_reindex builds the next ones
+curl -X PUT "http://localhost:9200/main_index-initial" -H 'Content-Type: application/json' -d '{
   "settings": {
     "number_of_shards": 1,
     "number_of_replicas": 0
+  },
+  "aliases": {
+    "main_index": {}
   }
 }'
\ No newline at end of file
@@ -1,4 +1,4 @@
 #!/bin/sh
 python3 manage.py migrate
 celery -A core.celery worker -E --loglevel=info --hostname=worker.basic --concurrency=3 &
-python3 manage.py runserver 0.0.0.0:8000
\ No newline at end of file
+uvicorn core.asgi:application --host 0.0.0.0 --port 8000
\ No newline at end of file
@@ -0,0 +1,62 @@
+from unittest.mock import patch
+
+import pytest
+from celery.exceptions import Retry
+from elasticsearch import ConnectionError
+
+from cafe.documents import ItemDocument
+from cafe.models import Item
+from core.celery import flush_search_index
+from core.indexing import FLUSH_SCHEDULED_KEY, enqueue, flush_index_queue, get_queue_key
+from core.redis import get_redis
+from core.settings import SEARCH_INDEX_RETRY_BACKOFF
+
+
+class TestSearchIndexQueue:
+    def test_repeated_saves_are_queued_once(self, django_capture_on_commit_callbacks, apply_async) -> None:
+        with django_capture_on_commit_callbacks(execute=True):
+            item = Item.objects.create(name='Суп', price=600)
+            item.price = 700
+            item.save()
+            item.save()
+
+        assert get_redis().smembers(get_queue_key(Item)) == {str(item.pk)}
+        assert apply_async.call_count == 1
+
+    def test_failed_bulk_requeues_ids(self) -> None:
+        items = Item.objects.bulk_create([Item(name='Суп', price=600), Item(name='Пиво', price=300)])
+        enqueue(Item, [item.pk for item in items])
+
+        with patch.object(ItemDocument, 'bulk', side_effect=ConnectionError('down')):
+            with pytest.raises(ConnectionError):
+                flush_index_queue()
+
+        assert get_redis().smembers(get_queue_key(Item)) == {str(item.pk) for item in items}
+
+    def test_deleted_object_is_removed(self) -> None:
+        item = Item.objects.create(name='Суп', price=600)
+        pk = item.pk
+        item.delete()
+        enqueue(Item, [pk])
+
+        with patch.object(ItemDocument, 'bulk') as bulk:
+            assert flush_index_queue() == 1
+
+        assert bulk.call_args.args[0] == [{'_op_type': 'delete', '_index': ItemDocument._index._name, '_id': pk}]
+        assert not get_redis().smembers(get_queue_key(Item))
+
+    def test_flush_retries_with_backoff(self) -> None:
+        with patch('core.indexing.flush_index_queue', side_effect=ConnectionError('down')), \
+                patch.object(flush_search_index, 'retry', side_effect=Retry) as retry:
+            flush_search_index.apply(retries=2)
+
+        assert retry.call_args.kwargs['countdown'] == SEARCH_INDEX_RETRY_BACKOFF * 4
+
+    @pytest.fixture(scope='function', autouse=True, name='apply_async')
+    def clean_queue(self, db):
+        connection = get_redis()
+        connection.delete(get_queue_key(Item), FLUSH_SCHEDULED_KEY)
+        # the flush task itself is not run, only scheduled
+        with patch.object(flush_search_index, 'apply_async') as apply_async:
+            yield apply_async
+        connection.delete(get_queue_key(Item), FLUSH_SCHEDULED_KEY)
@@ -1,10 +1,18 @@
+from unittest.mock import patch
+
 import pytest
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from elasticsearch import ConnectionError
+from elasticsearch_dsl import Search
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.test import APIClient
 
+from cafe import menu_index
 from cafe.models import Item
+from cafe.serializers import ItemSerializer
 from tests.factories import EmailAddressAdminFactory, ItemFactory
 
 User = get_user_model()
@@ -24,6 +32,114 @@ class TestItems:
         assert response_data['results'][0]['id'] == Item.objects.first().id
         assert len(response_data['results']) == 5
 
+    def test_item_list_urls(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('item-list')
+
+        response = client.get(url, format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        for item in response_data['results']:
+            assert item['url'] == f"http://testserver{reverse('item-detail', kwargs={'pk': item['id']})}"
+
+    def test_item_list_matches_serializer(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+
+        for query in [{}, {'fields': 'url,name'}]:
+            response = client.get(reverse('item-list'), query, format='json')
+            expected = ItemSerializer(Item.objects.order_by('id')[:5], many=True,
+                                      context={'request': Request(response.wsgi_request)}).data
+
+            assert response.status_code == status.HTTP_200_OK
+            assert JSONRenderer().render(response.data['results']) == JSONRenderer().render(expected)
+
+    def test_item_sparse_fields(self, client: APIClient) -> None:
+        user = User.objects.first()
+        item = Item.objects.first()
+        client.force_authenticate(user=user)
+
+        response = client.get(reverse('item-list'), {'fields': 'id,name,price'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert all(set(result) == {'id', 'name', 'price'} for result in response.json()['results'])
+
+        response = client.get(reverse('item-detail', args=[item.id]), {'fields': 'id,price'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == {'id': item.id, 'price': item.price}
+
+        response = client.get(reverse('item-list'), {'fields': 'id,secret'}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'fields' in response.json()
+
+    def test_item_multi_get(self, client: APIClient) -> None:
+        user = User.objects.first()
+        first, second = Item.objects.order_by('id')[:2]
+        missing = Item.objects.order_by('-id').first().id + 1
+        client.force_authenticate(user=user)
+
+        response = client.get(reverse('item-list'), {'ids': f'{second.id},{missing},{first.id}'}, format='json')
+        results = response.json()['results']
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [result['id'] for result in results] == [second.id, missing, first.id]
+        assert results[0]['name'] == second.name
+        assert results[1] == {'id': missing, 'detail': 'Не найдено.'}
+
+        response = client.get(reverse('item-list'), {'ids': 'first'}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_item_autocomplete_validation(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('items-autocomplete')
+
+        response = client.get(url, {'prefix': ' '}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'prefix' in response.json()
+
+        response = client.get(url, {'prefix': 'бор', 'size': 1000}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'size' in response.json()
+
+    def test_item_autocomplete_without_elasticsearch(self, client: APIClient, monkeypatch) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        item = Item.objects.create(name='Борщ украинский', price=450)
+        # the index of this process may be left from another test
+        monkeypatch.setattr(menu_index, '_index', None)
+        # big enough for elasticsearch to be asked first
+        monkeypatch.setattr('cafe.search.MENU_INDEX_MAX_ITEMS', 0)
+
+        with patch.object(Search, 'execute', side_effect=ConnectionError('down')):
+            response = client.get(reverse('items-autocomplete'), {'prefix': 'борщ укр'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json() == [{'id': item.id, 'name': 'Борщ украинский', 'price': 450}]
+
+    def test_item_list_cache(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('item-list')
+
+        first = client.get(url, format='json')
+        second = client.get(url, format='json')
+        ItemFactory.create()
+        third = client.get(url, format='json')
+
+        assert first['X-Cache'] == 'MISS'
+        assert second['X-Cache'] == 'HIT'
+        assert second.json() == first.json()
+        assert third['X-Cache'] == 'MISS'
+        assert third.json()['count'] == first.json()['count'] + 1
+
     def test_item_retrieve(self, client: APIClient) -> None:
         user = User.objects.first()
         item = Item.objects.first()
@@ -39,6 +155,23 @@ class TestItems:
         assert response_data['price'] == item.price
         assert len(response_data) == 4
 
+    def test_item_retrieve_not_modified(self, client: APIClient) -> None:
+        user = User.objects.first()
+        item = Item.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('item-detail', args=[item.id])
+
+        response = client.get(url, format='json')
+        etag = response['ETag']
+        not_modified = client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+        client.patch(url, {'price': item.price + 1}, format='json')
+        modified = client.get(url, format='json', HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not_modified.status_code == status.HTTP_304_NOT_MODIFIED
+        assert modified.status_code == status.HTTP_200_OK
+        assert modified['ETag'] != etag
+
     def test_item_create(self, client: APIClient) -> None:
         user = User.objects.first()
         client.force_authenticate(user=user)
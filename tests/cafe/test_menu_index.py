@@ -0,0 +1,121 @@
+from unittest.mock import patch
+
+import pytest
+
+from cafe import menu_index
+from cafe.menu_index import MenuIndex, tokenize, get_menu_index, build_menu_index, get_item_count, \
+    VERSION_KEY, CHANGES_KEY, COUNT_KEY
+from cafe.models import Item
+from core.celery import flush_search_index
+from core.redis import get_redis
+
+
+class TestMenuIndex:
+    @pytest.fixture(scope='function', name='index')
+    def menu_index(self) -> MenuIndex:
+        index = MenuIndex()
+        index.add(1, 'Борщ', 300, 'Свекольный суп со сметаной')
+        index.add(2, 'Салат Цезарь', 450, 'Курица, сухарики, соус цезарь')
+        index.add(3, 'Суп грибной', 250, 'Белые грибы и сметана')
+        return index
+
+    def test_tokenize(self) -> None:
+        assert tokenize('Ёжики в тумане, с зеленью') == ['ежик', 'туман', 'зелен']
+        assert tokenize('Coca-Cola') == ['coca', 'cola']
+
+    def test_search(self, index: MenuIndex) -> None:
+        # a name match is ranked above a description one
+        assert [pk for _, pk in index.search('суп')] == [3, 1]
+        assert [pk for _, pk in index.search('цезаря')] == [2]
+        assert [pk for _, pk in index.search('курицей')] == [2]
+        assert index.search('пицца') == []
+
+    def test_search_prefix_and_typos(self, index: MenuIndex) -> None:
+        assert [pk for _, pk in index.search('сала')] == [2]
+        assert [pk for _, pk in index.search('борш')] == [1]
+        assert [pk for _, pk in index.search('сметана')] == [1, 3]
+
+    def test_update(self, index: MenuIndex) -> None:
+        index.add(3, 'Суп гороховый', 250, '')
+        index.remove(1)
+
+        assert len(index) == 2
+        assert index.search('борщ') == []
+        assert index.search('грибы') == []
+        assert index.get_row(3) == {'id': 3, 'name': 'Суп гороховый', 'price': 250, 'description': ''}
+
+
+class TestMenuIndexSync:
+    def test_changes_are_synced_incrementally(self, django_capture_on_commit_callbacks,
+                                              django_assert_num_queries) -> None:
+        with django_capture_on_commit_callbacks(execute=True):
+            soup = Item.objects.create(name='Суп грибной', price=250)
+            borsch = Item.objects.create(name='Борщ', price=300)
+
+        index = get_menu_index()
+
+        assert index.version == 2
+        assert [pk for _, pk in index.search('суп')] == [soup.pk]
+        # an index at the shared version is served as is
+        with django_assert_num_queries(0):
+            assert get_menu_index() is index
+
+        with django_capture_on_commit_callbacks(execute=True):
+            soup.name = 'Суп гороховый'
+            soup.save()
+            borsch.delete()
+
+        with patch('cafe.menu_index.build_menu_index') as build:
+            assert get_menu_index() is index
+
+        build.assert_not_called()
+        assert index.version == 4
+        assert len(index) == 1
+        assert index.search('грибной') == []
+        assert index.search('борщ') == []
+        assert [pk for _, pk in index.search('гороховый')] == [soup.pk]
+
+    def test_changelog_overflow_rebuilds(self, django_capture_on_commit_callbacks, monkeypatch) -> None:
+        monkeypatch.setattr(menu_index, 'MENU_INDEX_CHANGELOG_SIZE', 2)
+        with django_capture_on_commit_callbacks(execute=True):
+            Item.objects.create(name='Борщ', price=300)
+        index = get_menu_index()
+
+        # three changes don't fit into the changelog of two
+        with django_capture_on_commit_callbacks(execute=True):
+            for name in ['Суп', 'Пиво', 'Квас']:
+                Item.objects.create(name=name, price=100)
+
+        assert get_redis().zcard(CHANGES_KEY) == 2
+        with patch('cafe.menu_index.build_menu_index', wraps=build_menu_index) as build:
+            rebuilt = get_menu_index()
+
+        build.assert_called_once_with(4)
+        assert rebuilt is not index
+        assert rebuilt.version == 4
+        assert len(rebuilt) == 4
+
+    def test_item_count_is_cached(self, django_capture_on_commit_callbacks, django_assert_num_queries) -> None:
+        Item.objects.create(name='Борщ', price=300)
+
+        with django_assert_num_queries(1):
+            assert get_item_count() == 1
+        with django_assert_num_queries(0):
+            assert get_item_count() == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Item.objects.create(name='Суп', price=250)
+
+        assert get_item_count() == 2
+        # counting doesn't build the index
+        assert menu_index._index is None
+
+    @pytest.fixture(scope='function', autouse=True, name='clean_index')
+    def clean_menu_index(self, db, monkeypatch):
+        monkeypatch.setattr(menu_index, '_index', None)
+        connection = get_redis()
+        connection.delete(VERSION_KEY, CHANGES_KEY, COUNT_KEY)
+        # items are also queued for elasticsearch, the flush task is not run
+        with patch.object(flush_search_index, 'apply_async'):
+            yield
+        connection.delete(VERSION_KEY, CHANGES_KEY, COUNT_KEY)
@@ -1,14 +1,21 @@
 import datetime
+import json
+from io import StringIO
 from urllib.parse import urlencode
 
 import pytest
+from django.core.management import call_command
+from django.db import IntegrityError
 from django.urls import reverse
 from django.test import override_settings
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.test import APIClient
 
-from cafe.models import Item, Order
+from cafe.models import Item, Order, OrderLine, DailyRevenue, HourlyTableRevenue
+from cafe.serializers import OrderSerializer
 from tests.factories import EmailAddressAdminFactory
 
 User = get_user_model()
@@ -36,6 +43,23 @@ class TestOrders:
         assert len(response_data['results'][0]['items']) == 3
         assert response_data['results'][0]['total_price'] == 1400
 
+    def test_order_list_filter_date_range(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        today = datetime.date.today()
+        url = reverse('order-list')
+
+        response = client.get(f"{url}?{urlencode({'date_from': today, 'date_to': today})}", format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['count'] == 6
+
+        response = client.get(f"{url}?{urlencode({'date_to': today - datetime.timedelta(days=1)})}", format='json')
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['count'] == 0
+
+        response = client.get(f"{url}?{urlencode({'date': 'yesterday'})}", format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
     def test_order_list(self, client: APIClient) -> None:
         user = User.objects.first()
         client.force_authenticate(user=user)
@@ -51,6 +75,62 @@ class TestOrders:
         assert len(response_data['results'][0]['items']) == 3
         assert response_data['results'][0]['total_price'] == 1400
 
+    def test_order_list_matches_serializer(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        items = list(Item.objects.all())
+        Order.objects.create(table_number=7, items=[items[0], items[0], items[1]])
+        url = reverse('order-list')
+
+        response = client.get(url, format='json')
+        orders = Order.objects.prefetch_related('lines').order_by('-created')[:5]
+        expected = OrderSerializer(orders, many=True, context={'request': Request(response.wsgi_request)}).data
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['results'][0]['items'] == [items[0].id, items[0].id, items[1].id]
+        assert JSONRenderer().render(response.data['results']) == JSONRenderer().render(expected)
+
+    def test_order_list_keyset(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('order-list')
+        url = f"{url}?{urlencode({'cursor': '', 'page_size': 4})}"
+
+        response = client.get(url, format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_data['count'] == 6
+        assert [order['table_number'] for order in response_data['results']] == [6, 5, 4, 3]
+
+        response = client.get(f"{response_data['next']}&count=false", format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'count' not in response_data
+        assert response_data['next'] is None
+        assert [order['table_number'] for order in response_data['results']] == [2, 1]
+
+    def test_order_export(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('order-export')
+
+        response = client.get(f"{url}?{urlencode({'status': 'PAID'})}")
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/csv')
+        assert lines[0] == 'id,table_number,status,total_price,created,items'
+        assert len(lines) == 4
+
+        response = client.get(f"{url}?{urlencode({'output': 'ndjson', 'table_number': 1})}")
+        lines = b''.join(response.streaming_content).decode().splitlines()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert len(lines) == 1
+        assert len(json.loads(lines[0])['items']) == 3
+
     def test_order_retrieve(self, client: APIClient) -> None:
         user = User.objects.first()
         order = Order.objects.first()
@@ -66,6 +146,22 @@ class TestOrders:
         assert response_data['total_price'] == order.total_price
         assert len(response_data) == 7
 
+    def test_order_expand_items(self, client: APIClient) -> None:
+        user = User.objects.first()
+        order = Order.objects.first()
+        client.force_authenticate(user=user)
+        expected = [{'id': item.id, 'name': item.name, 'price': item.price} for item in Item.objects.order_by('id')]
+
+        response = client.get(reverse('order-detail', args=[order.id]), {'expand': 'items'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()['items'] == expected
+
+        response = client.get(reverse('order-list'), {'expand': 'items'}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert all(result['items'] == expected for result in response.json()['results'])
+
     def test_order_create(self, client: APIClient) -> None:
         user = User.objects.first()
         client.force_authenticate(user=user)
@@ -79,6 +175,119 @@ class TestOrders:
         assert len(response_data) == 7
         assert len(response_data['items']) == 1
 
+    def test_order_create_missing_items(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('order-list')
+        item_id = Item.objects.first().id
+
+        response = client.post(url, {'table_number': 1, 'items': [item_id, 999998, 999999]}, format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert '999998, 999999' in response_data['items'][0]
+
+    def test_order_bulk_create(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('order-bulk')
+        pasta = Item.objects.get(name='Паста')
+
+        response = client.post(url, [
+            {'table_number': 8, 'items': [pasta.id, pasta.id]},
+            {'table_number': 9, 'items': [999999]},
+            {'table_number': 10, 'items': [pasta.id], 'status': 'PAID'},
+        ], format='json')
+        results = response.json()['results']
+
+        assert response.status_code == status.HTTP_207_MULTI_STATUS
+        assert [result['index'] for result in results] == [0, 1, 2]
+        assert results[0]['total_price'] == 1000
+        # the same error as a single create reports
+        assert results[1]['errors'] == {'items': ['Объекты с id 999999 не существуют.']}
+        assert Order.objects.get(id=results[2]['id']).status == 'PAID'
+        assert OrderLine.objects.get(order_id=results[0]['id']).quantity == 2
+
+    def test_order_create_queries(self, client: APIClient, django_assert_num_queries) -> None:
+        client.force_authenticate(user=User.objects.select_related('email_address').first())
+        ids = list(Item.objects.values_list('id', flat=True))
+
+        # items by pk__in, savepoint, order, daily rollup, lines, release, lines read back for the response
+        with django_assert_num_queries(7):
+            response = client.post(reverse('order-list'), {'table_number': 7, 'items': ids + ids}, format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+
+        # one items lookup and one insert per table for the whole batch
+        with django_assert_num_queries(8):
+            response = client.post(reverse('order-bulk'), [
+                {'table_number': table_number, 'items': ids} for table_number in range(7, 12)
+            ], format='json')
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert Order.objects.filter(table_number__gte=7).count() == 6
+
+    def test_order_create_rolls_back_on_line_error(self) -> None:
+        pasta, soup = Item.objects.filter(name__in=['Паста', 'Суп']).order_by('name')
+        orders, revenue = Order.objects.count(), DailyRevenue.objects.get().orders_count
+        # the order total stays positive, the line price breaks its check constraint
+        soup.price = -100
+
+        with pytest.raises(IntegrityError):
+            Order.objects.create(table_number=7, items=[pasta, soup])
+
+        assert Order.objects.count() == orders
+        assert DailyRevenue.objects.get().orders_count == revenue
+
+    def test_order_transition(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('order-transition')
+        ids = list(Order.objects.filter(table_number__in=[1, 2, 4]).values_list('id', flat=True))
+
+        response = client.post(url, {'status': 'READY', 'ids': ids}, format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_data['count'] == 2
+        assert Order.objects.filter(status='READY').count() == 2
+
+        response = client.post(url, {'status': 'PAID', 'filter': {'table_number': [1]}}, format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_data['ids'] == [Order.objects.get(table_number=1).id]
+
+        response = client.post(reverse('calc_revenue'), {'date': datetime.date.today()}, format='json')
+        assert response.json()['revenue'] == 5600
+
+        response = client.post(url, {'status': 'WAIT', 'ids': ids}, format='json')
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_order_transition_unknown_filter(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        waiting = Order.objects.filter(status='WAIT').count()
+
+        response = client.post(reverse('order-transition'), {'status': 'READY', 'filter': {'tabel_number': 1}},
+                               format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'filter' in response.json()
+        assert Order.objects.filter(status='WAIT').count() == waiting
+
+    def test_order_transition_invalid_filter_value(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        waiting = Order.objects.filter(status='WAIT').count()
+
+        response = client.post(reverse('order-transition'), {'status': 'READY', 'filter': {'table_number': 'x'}},
+                               format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'table_number' in response.json()
+        assert Order.objects.filter(status='WAIT').count() == waiting
+
     def test_order_destroy(self, client: APIClient) -> None:
         user = User.objects.first()
         order = Order.objects.first()
@@ -112,6 +321,11 @@ class TestOrders:
         assert response_data['total_price'] == order.total_price
         assert len(response_data) == 7
 
+    def test_order_events_requires_admin(self, client: APIClient) -> None:
+        response = client.get(reverse('order-events'))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
     def test_calc_revenue(self, client: APIClient) -> None:
         user = User.objects.first()
         client.force_authenticate(user=user)
@@ -123,6 +337,94 @@ class TestOrders:
         assert response_data['revenue'] == 4200
         assert len(response_data) == 1
 
+    def test_item_price_update_keeps_order_totals(self, client: APIClient) -> None:
+        user = User.objects.first()
+        item = Item.objects.get(name='Пиво')
+        client.force_authenticate(user=user)
+        url = reverse('item-detail', args=[item.id])
+
+        response = client.patch(url, {'price': item.price + 100}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert set(Order.objects.values_list('total_price', flat=True)) == {1400}
+        assert set(OrderLine.objects.filter(item=item).values_list('price', flat=True)) == {300}
+
+    def test_order_create_with_quantity(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        url = reverse('order-list')
+        soup = Item.objects.get(name='Суп')
+        beer = Item.objects.get(name='Пиво')
+
+        response = client.post(url, {'table_number': 7, 'items': [soup.id, beer.id, soup.id]}, format='json')
+        response_data = response.json()
+        line = OrderLine.objects.get(order_id=response_data['id'], item=soup)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response_data['total_price'] == 1500
+        assert sorted(response_data['items']) == sorted([soup.id, soup.id, beer.id])
+        assert line.quantity == 2
+        assert line.price == 600
+
+    def test_calc_revenue_after_status_change(self, client: APIClient) -> None:
+        user = User.objects.first()
+        order = Order.objects.filter(status='WAIT').first()
+        client.force_authenticate(user=user)
+
+        response = client.patch(reverse('order-detail', args=[order.id]), {'status': 'PAID'}, format='json')
+        assert response.status_code == status.HTTP_200_OK
+
+        response = client.post(reverse('calc_revenue'), {'date': datetime.date.today()}, format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_data['revenue'] == 5600
+
+    def test_revenue_report(self, client: APIClient) -> None:
+        user = User.objects.first()
+        client.force_authenticate(user=user)
+        today = datetime.date.today()
+        url = reverse('revenue_report')
+        url = f"{url}?{urlencode({'date_from': today - datetime.timedelta(days=1), 'date_to': today})}"
+
+        response = client.get(url, format='json')
+        response_data = response.json()
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response_data['revenue'] == 4200
+        assert [day['revenue'] for day in response_data['days']] == [0, 4200]
+        assert [table['table_number'] for table in response_data['tables']] == [4, 5, 6]
+        assert sum(hour['orders_count'] for hour in response_data['hours']) == 3
+
+        order = Order.objects.only('id', 'status', 'total_price').get(table_number=4)
+        order.table_number = 7
+        order.save()
+        Order.objects.get(table_number=5).delete()
+        paid_id = Order.objects.get(table_number=1).id
+        client.post(reverse('order-transition'), {'status': 'READY', 'ids': [paid_id]}, format='json')
+        client.post(reverse('order-transition'), {'status': 'PAID', 'ids': [paid_id]}, format='json')
+
+        response_data = client.get(url, format='json').json()
+
+        assert [(table['table_number'], table['revenue']) for table in response_data['tables']] == [
+            (1, 1400), (6, 1400), (7, 1400)
+        ]
+
+    def test_refresh_revenue(self) -> None:
+        today = datetime.date.today()
+        yesterday = today - datetime.timedelta(days=1)
+        # queryset updates bypass the signals that keep the rollups
+        Order.objects.filter(table_number=1).update(status='PAID')
+        DailyRevenue.objects.create(date=yesterday, orders_count=1, paid_count=1, revenue=100)
+
+        call_command('refresh_revenue', date_from=yesterday, date_to=today, stdout=StringIO())
+
+        assert DailyRevenue.objects.get(date=today).revenue == 5600
+        assert DailyRevenue.objects.get(date=yesterday).revenue == 0
+        assert sorted(HourlyTableRevenue.objects.filter(paid_count__gt=0).values_list('table_number', flat=True)) == [
+            1, 4, 5, 6
+        ]
+
     @pytest.fixture(scope='function', autouse=True, name='setup_admin_db')
     def create_admin_users(self, db) -> None:
         EmailAddressAdminFactory.create_batch(1)
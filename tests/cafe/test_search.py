@@ -0,0 +1,170 @@
+from typing import List
+from unittest.mock import patch
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from elasticsearch import ConnectionError
+from elasticsearch_dsl import Search
+from rest_framework import serializers, status
+from rest_framework.test import APIClient
+
+from cafe import menu_index
+from cafe.menu_index import VERSION_KEY, CHANGES_KEY, COUNT_KEY
+from cafe.models import Item
+from cafe.search import search_items, autocomplete_items, encode_search_after, hydrate_items
+from core.indexing import bump_search_version
+from core.redis import get_redis
+from tests.factories import EmailAddressAdminFactory
+
+User = get_user_model()
+
+
+class TestSearchRouting:
+    def test_small_catalog_is_searched_in_process(self) -> None:
+        with patch('cafe.search.search_items_es') as search_es, patch.object(Search, 'execute') as execute:
+            total, rows, _ = search_items('суп', 10)
+            suggestions = autocomplete_items('бор', 10)
+
+        search_es.assert_not_called()
+        execute.assert_not_called()
+        assert total == 2
+        assert [row['name'] for row in rows] == ['Суп грибной', 'Борщ']
+        assert [row['name'] for row in suggestions] == ['Борщ']
+
+    def test_big_catalog_is_searched_by_elasticsearch(self, monkeypatch) -> None:
+        monkeypatch.setattr('cafe.search.MENU_INDEX_MAX_ITEMS', 1)
+        soup = Item.objects.get(name='Суп грибной')
+        hit = {'id': soup.id, 'name': soup.name, 'price': soup.price, 'description': '', 'score': 1.0}
+
+        with patch('cafe.search.search_items_es', return_value=(1, [hit], [1.0, soup.id])) as search_es, \
+                patch.object(Search, 'execute', return_value=[]) as execute, \
+                patch('cafe.menu_index.build_menu_index') as build:
+            assert search_items('суп', 10) == (1, [hit], [1.0, soup.id])
+            assert autocomplete_items('суп', 10) == []
+
+        search_es.assert_called_once()
+        execute.assert_called_once()
+        # the menu index is neither built nor synced on the elasticsearch path
+        build.assert_not_called()
+        assert menu_index._index is None
+
+    def test_elasticsearch_failure_falls_back_to_menu_index(self, monkeypatch) -> None:
+        monkeypatch.setattr('cafe.search.MENU_INDEX_MAX_ITEMS', 1)
+
+        with patch('cafe.search.search_items_es', side_effect=ConnectionError('down')), \
+                patch.object(Search, 'execute', side_effect=ConnectionError('down')):
+            total, rows, _ = search_items('суп', 10)
+            suggestions = autocomplete_items('бор', 10)
+
+        assert total == 2
+        assert [row['name'] for row in rows] == ['Суп грибной', 'Борщ']
+        assert [row['name'] for row in suggestions] == ['Борщ']
+
+    @pytest.fixture(scope='function', autouse=True, name='setup_db')
+    def create_items(self, db, monkeypatch):
+        monkeypatch.setattr(menu_index, '_index', None)
+        get_redis().delete(VERSION_KEY, CHANGES_KEY, COUNT_KEY)
+        # autocomplete results cached by earlier runs are keyed by the old version
+        bump_search_version(Item)
+        Item.objects.bulk_create([
+            Item(name='Борщ', price=300, description='Свекольный суп со сметаной'),
+            Item(name='Суп грибной', price=250, description='Белые грибы и сметана'),
+            Item(name='Пиво', price=300),
+        ])
+        yield
+        get_redis().delete(VERSION_KEY, CHANGES_KEY, COUNT_KEY)
+
+
+class TestSearchItems:
+    def test_search_from_size(self, client: APIClient) -> None:
+        client.force_authenticate(user=User.objects.first())
+        pages = []
+
+        response = client.get(reverse('items-search'), {'match': 'суп', 'size': 3}, format='json')
+        while True:
+            response_data = response.json()
+            assert response.status_code == status.HTTP_200_OK
+            assert response_data['count'] == 7
+            pages.append([result['id'] for result in response_data['results']])
+            if response_data['next'] is None:
+                break
+            response = client.get(response_data['next'], format='json')
+
+        assert pages == [self.soups[:3], self.soups[3:6], self.soups[6:]]
+
+    def test_search_after(self, client: APIClient) -> None:
+        client.force_authenticate(user=User.objects.first())
+        pages = []
+
+        response = client.get(reverse('items-search'), {'match': 'суп', 'size': 3, 'search_after': ''},
+                              format='json')
+        while True:
+            response_data = response.json()
+            assert response.status_code == status.HTTP_200_OK
+            pages.append([result['id'] for result in response_data['results']])
+            if response_data['next'] is None:
+                break
+            assert 'search_after=' in response_data['next']
+            response = client.get(response_data['next'], format='json')
+
+        # the last full page can't know there is nothing after it
+        assert pages == [self.soups[:3], self.soups[3:6], self.soups[6:]]
+
+    @pytest.mark.parametrize('params', [
+        {'search_after': 'not a cursor'},
+        {'search_after': encode_search_after(['x', 1])},
+        {'search_after': encode_search_after([1.0])},
+        {'search_after': encode_search_after([float('nan'), 1])},
+        {'search_after': encode_search_after([1.0, 1]), 'from': 3},
+        {'from': 9999, 'size': 2},
+    ])
+    def test_search_invalid_paging(self, client: APIClient, params: dict) -> None:
+        client.force_authenticate(user=User.objects.first())
+
+        response = client.get(reverse('items-search'), {'match': 'суп', **params}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_search_hydrates_fields_not_indexed(self, client: APIClient) -> None:
+        client.force_authenticate(user=User.objects.first())
+        soup = Item.objects.get(id=self.soups[0])
+
+        response = client.get(reverse('items-search'), {'match': 'суп', 'size': 1, 'fields': 'id,updated,score'},
+                              format='json')
+        result = response.json()['results'][0]
+
+        assert response.status_code == status.HTTP_200_OK
+        assert set(result) == {'id', 'updated', 'score'}
+        assert result['id'] == soup.id
+        assert result['updated'] == serializers.DateTimeField().to_representation(soup.updated)
+
+        response = client.get(reverse('items-search'), {'match': 'суп', 'size': 1}, format='json')
+
+        assert 'updated' not in response.json()['results'][0]
+
+    def test_hydrate_drops_deleted_items(self) -> None:
+        deleted, kept = self.soups[:2]
+        rows = [{'id': deleted, 'score': 1.0}, {'id': kept, 'score': 1.0}]
+        Item.objects.filter(id=deleted).delete()
+
+        assert hydrate_items(rows, ['id', 'updated']) == [
+            {'id': kept, 'score': 1.0, 'updated': Item.objects.get(id=kept).updated}
+        ]
+        # rows built from indexed fields only are not looked up
+        assert hydrate_items(rows, ['id', 'name', 'price']) is rows
+
+    @property
+    def soups(self) -> List[int]:
+        # equal scores are ordered by id
+        return list(Item.objects.filter(name__startswith='Суп').order_by('id').values_list('id', flat=True))
+
+    @pytest.fixture(scope='function', autouse=True, name='setup_db')
+    def create_items(self, db, monkeypatch):
+        EmailAddressAdminFactory.create_batch(1)
+        monkeypatch.setattr(menu_index, '_index', None)
+        get_redis().delete(VERSION_KEY, CHANGES_KEY, COUNT_KEY)
+        Item.objects.bulk_create([Item(name=f'Суп {number}', price=100 * number) for number in range(1, 8)])
+        Item.objects.create(name='Пиво', price=300)
+        yield
+        get_redis().delete(VERSION_KEY, CHANGES_KEY, COUNT_KEY)
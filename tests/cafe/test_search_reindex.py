@@ -0,0 +1,110 @@
+from io import StringIO
+from typing import Dict, List
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from elasticsearch_dsl import Index
+
+from cafe.models import Item
+
+OLD_INDEX = 'main_index-20240101000000'
+
+
+class FakeElasticsearch:
+    """
+    Keeps the documents of the new index in a dict and records the calls that change it or the alias.
+    """
+
+    def __init__(self):
+        self.documents: Dict[str, dict] = {}
+        self.calls: List[tuple] = []
+        self.during_build = lambda: None
+        self.client = MagicMock()
+        self.client.count.side_effect = lambda index: {'count': len(self.documents)}
+        self.client.indices.exists_alias.return_value = True
+        self.client.indices.get_alias.return_value = {OLD_INDEX: {'aliases': {'main_index': {}}}}
+        self.client.indices.update_aliases.side_effect = lambda actions: self.calls.append(('aliases', actions))
+
+    def apply(self, actions: List[dict]) -> None:
+        for action in actions:
+            if action.get('_op_type') == 'delete':
+                self.documents.pop(str(action['_id']), None)
+            else:
+                self.documents[str(action['_id'])] = action['_source']
+
+    def parallel_bulk(self, client, actions, **kwargs):
+        actions = list(actions)
+        self.apply(actions)
+        self.during_build()
+        return [(True, {}) for _ in actions]
+
+    def bulk(self, client, actions, **kwargs):
+        actions = list(actions)
+        self.apply(actions)
+        self.calls.append(('bulk', actions))
+        return len(actions), []
+
+    def scan(self, client, index, query):
+        return [{'_id': pk} for pk in list(self.documents)]
+
+
+class TestSearchReindex:
+    def test_reindex_catches_up_before_swap(self, es: FakeElasticsearch) -> None:
+        borsch, soup, beer = Item.objects.order_by('id')
+        soup_id = soup.id
+
+        def change_items():
+            # what the flush task would have sent to the old index while the new one was built
+            soup.delete()
+            borsch.price = 350
+            borsch.save()
+            Item.objects.create(name='Квас', price=150)
+
+        es.during_build = change_items
+        stdout = StringIO()
+
+        call_command('search_reindex', stdout=stdout)
+
+        kvass = Item.objects.get(name='Квас')
+        assert es.calls[0][0] == 'bulk'
+        assert {(action.get('_op_type', 'index'), action['_id']) for action in es.calls[0][1]} == {
+            ('index', borsch.id), ('index', kvass.id), ('delete', str(soup_id))
+        }
+        aliases = es.calls[1][1]
+        assert aliases[0] == {'remove': {'index': OLD_INDEX, 'alias': 'main_index'}}
+        assert aliases[1]['add']['alias'] == 'main_index'
+        assert all(action['_index'] == aliases[1]['add']['index'] for action in es.calls[0][1])
+        # nothing changed after the first pass
+        assert es.calls[2] == ('bulk', [])
+        assert set(es.documents) == {str(borsch.id), str(beer.id), str(kvass.id)}
+        assert es.documents[str(borsch.id)]['price'] == 350
+        es.client.indices.delete.assert_called_once_with(index=OLD_INDEX, ignore_unavailable=True)
+        assert '3 documents' in stdout.getvalue() and '3 caught up' in stdout.getvalue()
+
+    def test_reindex_count_mismatch(self, es: FakeElasticsearch) -> None:
+        es.client.count.side_effect = lambda index: {'count': len(es.documents) - 1}
+
+        with patch.object(Index, 'delete') as delete, pytest.raises(CommandError, match='expected 3'):
+            call_command('search_reindex', stdout=StringIO())
+
+        delete.assert_called_once_with(ignore_unavailable=True)
+        assert not es.calls
+        es.client.indices.update_aliases.assert_not_called()
+
+    @pytest.fixture(scope='function', name='es')
+    def fake_elasticsearch(self, db):
+        Item.objects.bulk_create([
+            Item(name='Борщ', price=300),
+            Item(name='Суп', price=250),
+            Item(name='Пиво', price=300),
+        ])
+        es = FakeElasticsearch()
+        command = 'cafe.management.commands.search_reindex'
+        with patch.object(Index, '_get_connection', return_value=es.client), \
+                patch.object(Index, 'create'), patch.object(Index, 'refresh'), \
+                patch(f'{command}.parallel_bulk', es.parallel_bulk), \
+                patch(f'{command}.bulk', es.bulk), \
+                patch(f'{command}.scan', es.scan):
+            yield es
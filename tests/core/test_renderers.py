@@ -0,0 +1,70 @@
+import datetime
+import io
+from decimal import Decimal
+
+import pytest
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework import parsers, renderers
+from rest_framework.exceptions import ParseError
+
+from core.parsers import JSONParser
+from core.renderers import JSONRenderer
+
+
+class TestJSONRenderer:
+    def test_render_matches_drf(self) -> None:
+        now = timezone.now()
+        data = {
+            'count': 2,
+            'next': None,
+            'created': now,
+            'day': now.date(),
+            'time': datetime.time(12, 30, 15, 250000),
+            'duration': datetime.timedelta(minutes=90),
+            'discount': Decimal('0.05'),
+            'currency': gettext_lazy('руб.'),
+            'tables': {1: 'WAIT', 2: 'PAID'},
+            'score': 1.5,
+            'separators': 'a\u2028b\u2029c',
+            'results': [{'id': 1, 'items': [1, 2, 2], 'description': None}, {'id': 2, 'items': (), 'price': 0.0}],
+        }
+
+        assert JSONRenderer().render(data) == renderers.JSONRenderer().render(data)
+
+    @pytest.mark.parametrize('value', [float('nan'), float('inf'), float('-inf')])
+    def test_render_rejects_non_finite_floats(self, value: float) -> None:
+        data = {'next': None, 'results': [{'id': 1, 'score': value}]}
+
+        with pytest.raises(ValueError):
+            renderers.JSONRenderer().render(data)
+        with pytest.raises(ValueError):
+            JSONRenderer().render(data)
+
+    def test_render_non_strict_matches_drf(self) -> None:
+        data = {'score': float('nan')}
+
+        class Renderer(JSONRenderer):
+            strict = False
+
+        class DRFRenderer(renderers.JSONRenderer):
+            strict = False
+
+        assert Renderer().render(data) == DRFRenderer().render(data) == b'{"score":NaN}'
+
+
+class TestJSONParser:
+    @pytest.mark.parametrize('body', [
+        b'{"table_number": 1, "items": [1, 2, 2], "status": null}',
+        '{"name": "Суп \\u0434\\u043d\\u044f", "price": 1.5}'.encode(),
+        b'[]',
+    ])
+    def test_parse_matches_drf(self, body: bytes) -> None:
+        assert JSONParser().parse(io.BytesIO(body)) == parsers.JSONParser().parse(io.BytesIO(body))
+
+    @pytest.mark.parametrize('body', [b'{"price": NaN}', b'{"price": Infinity}', b'{"price": 1', b''])
+    def test_parse_rejects_invalid_json(self, body: bytes) -> None:
+        with pytest.raises(ParseError):
+            parsers.JSONParser().parse(io.BytesIO(body))
+        with pytest.raises(ParseError):
+            JSONParser().parse(io.BytesIO(body))
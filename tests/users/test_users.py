@@ -4,9 +4,12 @@ import pytest
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
+from users.serializers import UsersListSerializer, AdminUsersListSerializer
 from tests.factories import EmailAddressFactory, EmailAddressAdminFactory
 
 User = get_user_model()
@@ -51,6 +54,21 @@ class TestUsers:
         assert len(response_data['results']) == 5
         assert 'is_staff' in response_data['results'][0]
 
+    def test_user_list_matches_serializer(self, client: APIClient, admin_token: Dict[str, str]) -> None:
+        first = User.objects.order_by('date_joined').first()
+        User.objects.filter(pk=first.pk).update(avatar=f'users/user_{first.pk}/avatar.webp')
+        url = reverse('users-list')
+
+        for serializer_class in [UsersListSerializer, AdminUsersListSerializer]:
+            if serializer_class is AdminUsersListSerializer:
+                client.credentials(HTTP_AUTHORIZATION='Bearer ' + admin_token['access'])
+            response = client.get(url, format='json')
+            expected = serializer_class(User.objects.order_by('date_joined')[:5], many=True,
+                                        context={'request': Request(response.wsgi_request)}).data
+
+            assert response.status_code == status.HTTP_200_OK
+            assert JSONRenderer().render(response.data['results']) == JSONRenderer().render(expected)
+
     def test_get_user_detail_as_anon(self, client: APIClient) -> None:
         target_user = User.objects.filter(is_staff=False).first()
         url = reverse('user-detail', args=[target_user.id])
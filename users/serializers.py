@@ -13,6 +13,7 @@ from rest_framework_simplejwt.tokens import Token
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework_simplejwt.settings import api_settings
 
+from core.serializers import HyperlinkedIdentityField, SparseFieldsMixin
 from users.authentication import JWTEmailOrPhoneBackend
 from users.models import PasswordResetToken
 from users.services import get_user_by_email
@@ -21,7 +22,7 @@ from users.tasks import crop_avatar
 User = get_user_model()
 
 
-class AdminUserDetailSerializer(serializers.ModelSerializer):
+class AdminUserDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.ReadOnlyField()
     email = serializers.ReadOnlyField()
     password = serializers.ReadOnlyField()
@@ -97,7 +98,7 @@ class AdminUserDetailSerializer(serializers.ModelSerializer):
         return ret
 
 
-class UserDetailSerializer(serializers.ModelSerializer):
+class UserDetailSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     id = serializers.ReadOnlyField()
     email = serializers.ReadOnlyField()
     password = serializers.ReadOnlyField()
@@ -172,7 +173,9 @@ class UserDetailSerializer(serializers.ModelSerializer):
         return ret
 
 
-class AdminUsersListSerializer(serializers.HyperlinkedModelSerializer):
+class AdminUsersListSerializer(SparseFieldsMixin, serializers.HyperlinkedModelSerializer):
+    serializer_url_field = HyperlinkedIdentityField
+
     class Meta:
         model = User
         fields = ['url', 'id', 'password', 'email', 'phone', 'name', 'avatar',
@@ -180,7 +183,9 @@ class AdminUsersListSerializer(serializers.HyperlinkedModelSerializer):
                   'date_joined', 'last_login']
 
 
-class UsersListSerializer(serializers.HyperlinkedModelSerializer):
+class UsersListSerializer(SparseFieldsMixin, serializers.HyperlinkedModelSerializer):
+    serializer_url_field = HyperlinkedIdentityField
+
     class Meta:
         model = User
         fields = ['url', 'id', 'email', 'phone', 'name', 'avatar',
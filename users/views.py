@@ -13,7 +13,9 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from drf_spectacular.utils import extend_schema, OpenApiResponse, extend_schema_view, OpenApiRequest, OpenApiParameter, \
     inline_serializer
 
+from core.serializers import ValuesSerializer
 from core.settings import EMAIL_CONFIRM_TIME
+from core.views import SparseFieldsViewMixin
 from .permissions import IsOwnerOrIsAdmin, IsEmailOwnerOrIsAdmin, IsActive
 from .serializers import (AdminUsersListSerializer, UsersListSerializer,
                           AdminUserDetailSerializer, UserDetailSerializer, PasswordChangeSerializer, RegisterSerializer,
@@ -29,7 +31,12 @@ User = get_user_model()
 @extend_schema_view(
     list=extend_schema(
         request=None,
-        parameters=None,
+        parameters=[
+            OpenApiParameter(name='fields', required=False, type=str,
+                             description='Comma separated fields to return, e.g. id,name,avatar',
+                             location=OpenApiParameter.QUERY
+                             ),
+        ],
         responses={
             HTTP_200_OK: OpenApiResponse(
                 description='Success',
@@ -42,7 +49,7 @@ User = get_user_model()
         description="Endpoint to get list of all users"
     )
 )
-class UsersView(ListAPIView):
+class UsersView(SparseFieldsViewMixin, ListAPIView):
     queryset = User.objects.all().order_by("date_joined")
 
     def get_serializer_class(self, *args, **kwargs) -> Type[AdminUsersListSerializer | UsersListSerializer]:
@@ -51,6 +58,16 @@ class UsersView(ListAPIView):
             return AdminUsersListSerializer
         return UsersListSerializer
 
+    def list(self, request: Request, *args, **kwargs) -> Response:
+        serializer = ValuesSerializer(self.get_serializer_class(), self.get_serializer_context())
+        queryset = self.filter_queryset(self.get_queryset()).values(*serializer.get_columns())
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.to_representation(page))
+
+        return Response(serializer.to_representation(queryset))
+
 
 @extend_schema_view(
     retrieve=extend_schema(
@@ -58,7 +75,11 @@ class UsersView(ListAPIView):
         parameters=[
             OpenApiParameter(name='id', required=True, type=int,
                              description='A unique integer value identifying this user',
-                             location=OpenApiParameter.PATH)
+                             location=OpenApiParameter.PATH),
+            OpenApiParameter(name='fields', required=False, type=str,
+                             description='Comma separated fields to return, e.g. id,name,avatar',
+                             location=OpenApiParameter.QUERY
+                             )
         ],
         responses={
             HTTP_200_OK: OpenApiResponse(
@@ -112,7 +133,7 @@ class UsersView(ListAPIView):
         description="Endpoint to partial change some user info"
     )
 )
-class UserDetailView(RetrieveUpdateAPIView):
+class UserDetailView(SparseFieldsViewMixin, RetrieveUpdateAPIView):
     queryset = User.objects.all().order_by("date_joined")
     permission_classes = [IsActive, IsOwnerOrIsAdmin]
 